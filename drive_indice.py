@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Índice local do conteúdo de uma pasta do Google Drive, atualizado pela Changes API
+
+Na primeira execução a pasta é listada por inteiro e guardamos um page token da Changes API.
+Nas seguintes, uma única chamada changes().list responde "o que mudou desde a última vez" e
+o índice (JSON em disco) é atualizado só com essas alterações.
+ResolvedorDrive acrescenta um cache em memória com TTL por cima do índice, das listagens e dos IDs.
+"""
+
+import json
+import os
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+from google_quota import executar_com_cota
+
+MIME_PASTA = 'application/vnd.google-apps.folder'
+MIME_PLANILHA = 'application/vnd.google-apps.spreadsheet'
+
+_CAMPOS_ARQUIVO = 'id, name, mimeType, modifiedTime, parents, trashed'
+
+
+class IndiceDrive:
+    """Filhos diretos de uma pasta (por nome), persistidos em `caminho` junto com o page token"""
+
+    def __init__(self, nome_pasta, caminho):
+        self.nome_pasta = nome_pasta
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._estado = self._carregar()
+
+    # ----- persistência -----
+
+    def _carregar(self):
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                estado = json.load(f)
+            if estado.get('nome_pasta') == self.nome_pasta:
+                return estado
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def _salvar(self):
+        try:
+            os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+            temporario = self.caminho + '.tmp'
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(self._estado, f, ensure_ascii=False)
+            os.replace(temporario, self.caminho)
+        except OSError as e:
+            print(f"[DRIVE] ⚠️ Não foi possível gravar o índice da pasta: {str(e)}")
+
+    # ----- sincronização -----
+
+    def _listar_filhos(self, drive_service, pasta_id):
+        """Todos os filhos da pasta (segue nextPageToken)"""
+        arquivos = []
+        page_token = None
+        while True:
+            resposta = executar_com_cota(drive_service.files().list(
+                q=f"'{pasta_id}' in parents and trashed=false",
+                fields=f"nextPageToken, files({_CAMPOS_ARQUIVO})",
+                pageSize=1000,
+                pageToken=page_token
+            ), limitador=None, descricao=self.nome_pasta)
+            arquivos.extend(resposta.get('files', []))
+            page_token = resposta.get('nextPageToken')
+            if not page_token:
+                return arquivos
+
+    def _reconstruir(self, drive_service):
+        """Lista a pasta do zero e guarda o page token atual da Changes API"""
+        # O token é obtido antes da listagem: alterações feitas durante ela aparecem no próximo delta
+        token = executar_com_cota(drive_service.changes().getStartPageToken(), limitador=None)['startPageToken']
+
+        resposta = executar_com_cota(drive_service.files().list(
+            q=f"name='{self.nome_pasta}' and mimeType='{MIME_PASTA}' and trashed=false",
+            fields="files(id, name)"
+        ), limitador=None, descricao=self.nome_pasta)
+        pastas = resposta.get('files', [])
+        if not pastas:
+            print(f"[DRIVE] ⚠️ Pasta '{self.nome_pasta}' não encontrada no Google Drive")
+            self._estado = {}
+            return False
+
+        pasta_id = pastas[0]['id']
+        arquivos = self._listar_filhos(drive_service, pasta_id)
+        self._estado = {
+            'nome_pasta': self.nome_pasta,
+            'pasta_id': pasta_id,
+            'page_token': token,
+            'arquivos': {a['id']: a for a in arquivos},
+        }
+        self._salvar()
+        print(f"[DRIVE] 📁 Índice da pasta '{self.nome_pasta}' reconstruído: {len(arquivos)} arquivo(s)")
+        return True
+
+    def _aplicar_alteracoes(self, drive_service):
+        """Aplica ao índice as alterações desde o page token guardado (uma chamada por página)"""
+        pasta_id = self._estado['pasta_id']
+        arquivos = self._estado['arquivos']
+        page_token = self._estado['page_token']
+        n_alteracoes = 0
+        while True:
+            resposta = executar_com_cota(drive_service.changes().list(
+                pageToken=page_token,
+                spaces='drive',
+                pageSize=1000,
+                fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({_CAMPOS_ARQUIVO}))"
+            ), limitador=None, descricao=self.nome_pasta)
+
+            for alteracao in resposta.get('changes', []):
+                file_id = alteracao.get('fileId')
+                arquivo = alteracao.get('file') or {}
+                removido = alteracao.get('removed') or arquivo.get('trashed')
+                if file_id == pasta_id and (removido or arquivo.get('name') != self.nome_pasta):
+                    # A própria pasta foi removida/renomeada: o índice não vale mais
+                    return False
+                if removido or pasta_id not in arquivo.get('parents', []):
+                    if arquivos.pop(file_id, None) is not None:
+                        n_alteracoes += 1
+                elif file_id != pasta_id:
+                    arquivos[file_id] = {k: v for k, v in arquivo.items() if k != 'trashed'}
+                    n_alteracoes += 1
+
+            if resposta.get('newStartPageToken'):
+                self._estado['page_token'] = resposta['newStartPageToken']
+                break
+            page_token = resposta.get('nextPageToken')
+
+        self._salvar()
+        print(f"[DRIVE] 🔄 Índice da pasta '{self.nome_pasta}': {n_alteracoes} alteração(ões) desde a última execução")
+        return True
+
+    def sincronizar(self, drive_service):
+        """
+        Atualiza o índice: delta pela Changes API quando há page token, senão listagem completa.
+        Token expirado/inválido ou pasta alterada -> reconstrói. Retorna False se a pasta não existe.
+        """
+        with self._lock:
+            if self._estado.get('page_token'):
+                try:
+                    if self._aplicar_alteracoes(drive_service):
+                        return True
+                except HttpError as e:
+                    print(f"[DRIVE] ⚠️ Page token da Changes API rejeitado ({str(e)}), reconstruindo índice...")
+            return self._reconstruir(drive_service)
+
+    # ----- consultas -----
+
+    @property
+    def pasta_id(self):
+        return self._estado.get('pasta_id')
+
+    def arquivos(self, mime_type=None):
+        """Filhos da pasta (opcionalmente de um mimeType), ordenados por nome"""
+        with self._lock:
+            itens = list(self._estado.get('arquivos', {}).values())
+        if mime_type:
+            itens = [a for a in itens if a.get('mimeType') == mime_type]
+        return sorted(itens, key=lambda a: a.get('name', ''))
+
+    def buscar(self, nome=None, contem=None, mime_type=None):
+        """Primeiro filho com nome exato `nome` ou que contém `contem` (sem diferenciar maiúsculas)"""
+        for arquivo in self.arquivos(mime_type):
+            nome_arquivo = arquivo.get('name', '')
+            if nome is not None and nome_arquivo == nome:
+                return arquivo
+            if contem is not None and contem.lower() in nome_arquivo.lower():
+                return arquivo
+        return None
+
+    def registrar(self, arquivo):
+        """Inclui no índice um arquivo criado por este processo (ex: pasta 'saidas')"""
+        with self._lock:
+            if self._estado.get('pasta_id') in arquivo.get('parents', []):
+                self._estado['arquivos'][arquivo['id']] = arquivo
+                self._salvar()
+
+
+# Validade (s) dos metadados do Drive em memória: dentro dela, o índice não é sincronizado de novo
+# e listagens/IDs já resolvidos são reaproveitados por todas as funções do job
+DRIVE_METADADOS_TTL_SEC = float(os.getenv("DRIVE_METADADOS_TTL_SEC", "300"))
+
+
+class ResolvedorDrive:
+    """
+    Cache com TTL dos metadados do Drive usados pelo app: sincronização do índice da pasta,
+    listagens (paginadas) e IDs resolvidos por nome (modelo, 'saidas', planilhas fixas).
+    """
+
+    def __init__(self, indice, ttl=DRIVE_METADADOS_TTL_SEC, ids_fixos=None):
+        self.indice = indice
+        self.ttl = ttl
+        self.ids_fixos = dict(ids_fixos or {})
+        self._lock = threading.Lock()
+        self._sincronizado_em = None
+        self._valores = {}  # chave -> (instante, valor)
+
+    def _valido(self, instante):
+        return instante is not None and time.monotonic() - instante < self.ttl
+
+    def _obter(self, chave):
+        with self._lock:
+            item = self._valores.get(chave)
+        if item and self._valido(item[0]):
+            return item[1]
+        return None
+
+    def _guardar(self, chave, valor):
+        with self._lock:
+            self._valores[chave] = (time.monotonic(), valor)
+
+    def sincronizar(self, drive_service, forcar=False):
+        """indice.sincronizar() no máximo uma vez por TTL (`forcar`: sempre consulta o delta)"""
+        if not forcar and self._valido(self._sincronizado_em) and self.indice.pasta_id:
+            return True
+        ok = self.indice.sincronizar(drive_service)
+        self._sincronizado_em = time.monotonic() if ok else None
+        return ok
+
+    def listar(self, drive_service, q, fields='id, name, modifiedTime'):
+        """files().list completo (todas as páginas) para a query, reaproveitado dentro do TTL"""
+        chave = ('listagem', q, fields)
+        arquivos = self._obter(chave)
+        if arquivos is not None:
+            return arquivos
+        arquivos = []
+        page_token = None
+        while True:
+            resposta = executar_com_cota(drive_service.files().list(
+                q=q,
+                fields=f"nextPageToken, files({fields})",
+                pageSize=1000,
+                pageToken=page_token
+            ), limitador=None)
+            arquivos.extend(resposta.get('files', []))
+            page_token = resposta.get('nextPageToken')
+            if not page_token:
+                break
+        self._guardar(chave, arquivos)
+        return arquivos
+
+    def resolver(self, chave, funcao=None):
+        """
+        ID guardado em `chave`: IDs fixos (configuração) têm prioridade; senão o resultado de
+        `funcao()` é reaproveitado dentro do TTL (None não é guardado).
+        """
+        if self.ids_fixos.get(chave):
+            return self.ids_fixos[chave]
+        valor = self._obter(('id', chave))
+        if valor is None and funcao is not None:
+            valor = funcao()
+            if valor is not None:
+                self._guardar(('id', chave), valor)
+        return valor
+
+    def invalidar(self, chave=None):
+        """Descarta um ID/listagem (chave) ou tudo, forçando nova consulta ao Drive"""
+        with self._lock:
+            if chave is None:
+                self._valores.clear()
+                self._sincronizado_em = None
+            else:
+                self._valores.pop(('id', chave), None)
+                for k in [k for k in self._valores if k[0] == 'listagem' and k[1] == chave]:
+                    self._valores.pop(k, None)
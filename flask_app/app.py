@@ -16,11 +16,13 @@ except ImportError:
 
 from flask import Flask, render_template, request, jsonify, send_file, redirect, session, url_for, Response
 import pandas as pd
+import numpy as np
 import os
 import glob
 from datetime import datetime
 import warnings
 import re
+import unicodedata
 from werkzeug.utils import secure_filename
 from werkzeug.middleware.proxy_fix import ProxyFix
 import io
@@ -28,8 +30,9 @@ import time
 import gspread
 import json
 import threading
-from googleapiclient.discovery import build
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from googleapiclient.http import MediaFileUpload
+from googleapiclient.errors import HttpError
 from openpyxl import load_workbook
 from copy import copy
 from openpyxl.utils import get_column_letter
@@ -45,9 +48,17 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from oauth_manager import (
     authorize_url, exchange_code_for_token, 
     get_authenticated_drive_service, get_authenticated_sheets_service,
-    load_credentials, save_credentials
+    get_credentials, load_credentials, save_credentials,
+    construir_cliente, preaquecer_clientes
 )
 from oauth_config import DRIVE_FOLDER_ID, TOKEN_FILE
+from google_quota import executar_com_cota
+from drive_indice import IndiceDrive, ResolvedorDrive, MIME_PASTA, MIME_PLANILHA
+from flask_app.cache_ingestao import CacheIngestao, CacheDadosIdentificador
+from flask_app.calendario_comercial import (
+    CALENDARIO_PERIODOS, CALENDARIO_MESES_2026,
+    rotular_mes_abreviado, rotular_ano
+)
 
 warnings.filterwarnings('ignore')
 
@@ -103,6 +114,7 @@ def ler_progresso():
 # Verificar se OAuth está configurado
 OAUTH_CONFIGURED = os.path.exists(TOKEN_FILE)
 print(f"[OAUTH] Status inicial: {'✅ Token carregado' if OAUTH_CONFIGURED else '⚠️ Não autenticado - acesse /authorize'}")
+preaquecer_clientes()
 
 app = Flask(__name__)
 # Configurar ProxyFix para Railway (essencial para url_for usar HTTPS)
@@ -278,7 +290,7 @@ def progresso_json():
 @app.route('/oauth-status')
 def oauth_status():
     """Retorna o status da autenticação OAuth"""
-    creds = load_credentials()
+    creds = get_credentials()
     if creds:
         return jsonify({
             'autenticado': True,
@@ -295,7 +307,7 @@ def oauth_status():
 @app.route('/debug-dados-id')
 def debug_dados_id():
     """
-    Debug: mostra exatamente o que o app recebe do Google Sheet DadosIdentificador.
+    Debug: mostra a tabela DadosIdentificador que o app usa no merge (mesmo cache do passo 1).
     Abra no navegador: http://localhost:5000/debug-dados-id
     """
     try:
@@ -305,39 +317,25 @@ def debug_dados_id():
                 'erro': 'Não autenticado',
                 'dica': 'Acesse /authorize primeiro e faça login no Google.'
             }), 401
-        sheet_id = "1UmWzuIpF1nEh1YUJH4pu9jJL7PJHvlQvHE4Pnrw6xhA"
-        spreadsheet = sheets_service.spreadsheets().get(spreadsheetId=sheet_id).execute()
-        sheets_list = spreadsheet.get('sheets', [])
-        if not sheets_list:
-            return jsonify({'erro': 'Planilha sem abas', 'sheet_id': sheet_id}), 404
-        sheet_title = sheets_list[0].get('properties', {}).get('title')
-        range_name = f"'{sheet_title}'!A:Z"
-        result = sheets_service.spreadsheets().values().get(
-            spreadsheetId=sheet_id, range=range_name
-        ).execute()
-        values = result.get('values', [])
-        if not values:
+        df_dados_id, info = carregar_dados_identificador()
+        if df_dados_id is None:
             return jsonify({
-                'mensagem': 'Planilha vazia',
-                'sheet_id': sheet_id,
-                'aba': sheet_title,
+                'mensagem': 'Planilha vazia ou sem coluna Identificador',
+                'sheet_id': info['sheet_id'],
+                'aba': info['aba'],
                 'linhas': 0
             }), 200
-        # Primeiras linhas brutas (o que a API retorna)
-        linha1 = values[0] if len(values) > 0 else []
-        linha2 = values[1] if len(values) > 1 else []
-        linha3 = values[2] if len(values) > 2 else []
-        # Nomes das colunas (linha 1) com índice para referência
-        colunas_com_indice = [{'indice': i, 'nome': str(v)[:50]} for i, v in enumerate(linha1)]
+        # Primeiras linhas da tabela usada no merge (como na planilha; normalizada no merge)
+        primeiras = df_dados_id.head(3).astype(object)
+        primeiras = primeiras.where(primeiras.notna(), None)
         return jsonify({
-            'sheet_id': sheet_id,
-            'aba': sheet_title,
-            'total_linhas': len(values),
-            'linha_1_cabecalho': linha1,
-            'linha_2': linha2,
-            'linha_3': linha3,
-            'colunas_com_indice': colunas_com_indice,
-            'dica': 'Identificador costuma ser coluna 0 (A), Universo coluna 11 (L), porc coluna 10 (K). Use essas posições se os nomes não baterem.'
+            'sheet_id': info['sheet_id'],
+            'modified_time': info['modified_time'],
+            'origem': info['origem'],
+            'total_linhas': len(df_dados_id),
+            'colunas': list(df_dados_id.columns),
+            'primeiras_linhas': primeiras.to_dict(orient='records'),
+            'dica': 'Colunas reconhecidas pelo nome (strip+lower): Identificador/ID, Universo, porc (ou perc, %, percentual). origem=cache: planilha sem mudanças desde a última leitura.'
         }), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
@@ -347,36 +345,6 @@ def debug_dados_id():
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['SAIDAS_FOLDER'], exist_ok=True)
 
-# Períodos comerciais
-PERIODOS_COMERCIAIS = {
-    # 2025
-    "Jan'25": ("2024-12-25", "2025-01-28"),
-    "Fev'25": ("2025-01-29", "2025-02-25"),
-    "Mar'25": ("2025-02-26", "2025-03-31"),
-    "Abr'25": ("2025-04-01", "2025-04-28"),
-    "Mai'25": ("2025-04-29", "2025-05-26"),
-    "Jun'25": ("2025-05-27", "2025-06-30"),
-    "Jul'25": ("2025-07-01", "2025-07-28"),
-    "Ago'25": ("2025-07-29", "2025-08-25"),
-    "Set'25": ("2025-08-26", "2025-09-29"),
-    "Out'25": ("2025-09-30", "2025-10-27"),
-    "Nov'25": ("2025-10-28", "2025-11-24"),
-    "Dez'25": ("2025-11-25", "2025-12-29"),
-    # 2026
-    "Jan'26": ("2025-12-30", "2026-01-26"),
-    "Fev'26": ("2026-01-27", "2026-02-23"),
-    "Mar'26": ("2026-02-24", "2026-03-30"),
-    "Abr'26": ("2026-03-31", "2026-04-27"),
-    "Mai'26": ("2026-04-28", "2026-05-25"),
-    "Jun'26": ("2026-05-26", "2026-06-29"),
-    "Jul'26": ("2026-06-30", "2026-07-27"),
-    "Ago'26": ("2026-07-28", "2026-08-31"),
-    "Set'26": ("2026-09-01", "2026-09-28"),
-    "Out'26": ("2026-09-29", "2026-10-26"),
-    "Nov'26": ("2026-10-27", "2026-11-30"),
-    "Dez'26": ("2026-12-01", "2026-12-28"),
-}
-
 # Mapa de praças
 MAPA_PRACAS = {
     "São Paulo Capital": ["São Paulo / SP"],
@@ -404,35 +372,71 @@ MAPA_PRACAS = {
     "Bauru": ["Bauru / SP"],
 }
 
+def _normalizar_cidade(cidade):
+    """Chave de busca da cidade: sem acentos, maiúscula, espaços únicos e ' / ' padronizado ('sao paulo/sp' -> 'SAO PAULO / SP')"""
+    texto = unicodedata.normalize('NFKD', str(cidade))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r'\s*/\s*', ' / ', texto)
+    return re.sub(r'\s+', ' ', texto).strip().upper()
+
+# Índice invertido cidade normalizada -> posição da praça, montado uma vez na inicialização.
+# Categorias em ordem alfabética para o groupby do passo 2 manter a mesma ordem das strings.
+PRACAS = sorted(MAPA_PRACAS)
+_INDICE_PRACAS = {
+    _normalizar_cidade(cidade): PRACAS.index(praca)
+    for praca, cidades in MAPA_PRACAS.items()
+    for cidade in cidades
+}
+
 # ==============================================================================
 # UTILITÁRIOS PARA GERENCIAR ARQUIVOS NA PASTA SAIDAS
 # ==============================================================================
 
 import glob as glob_module
 
+# Índice local da pasta RelatorioVeri mantido pela Changes API (ver drive_indice.py): cada job
+# pergunta ao Drive só o que mudou desde o anterior, em vez de listar a pasta por nome de novo
+PASTA_RELATORIOS = 'RelatorioVeri'
+_CACHE_DRIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache_drive')
+indice_relatorioveri = IndiceDrive(PASTA_RELATORIOS, os.path.join(_CACHE_DRIVE_DIR, 'indice_relatorioveri.json'))
+
+# Planilhas com ID fixo (podem ser trocadas pelo .env)
+DADOS_IDENTIFICADOR_SHEET_ID = os.getenv('DADOS_IDENTIFICADOR_SHEET_ID') or "1UmWzuIpF1nEh1YUJH4pu9jJL7PJHvlQvHE4Pnrw6xhA"
+SEMANAL_OFICIAL_FILE_ID = os.getenv('SEMANAL_OFICIAL_FILE_ID') or "1o5RJnLMpMHMtvyG7FscwFhz37sxcc0_T"
+
+# Metadados do Drive compartilhados pelas funções do job (sincronização do índice, listagens
+# paginadas, IDs do modelo/'saidas'/planilhas fixas), com TTL em memória
+resolvedor_drive = ResolvedorDrive(indice_relatorioveri, ids_fixos={
+    'dados_identificador': DADOS_IDENTIFICADOR_SHEET_ID,
+    'semanal_oficial': SEMANAL_OFICIAL_FILE_ID,
+})
+
+def _listar_google_sheets_da_pasta(drive_service, folder_name):
+    """Listagem (sem índice) dos Google Sheets de uma pasta, por nome, com todas as páginas"""
+    folder_query = f"name='{folder_name}' and mimeType='{MIME_PASTA}' and trashed=false"
+    folders = resolvedor_drive.listar(drive_service, folder_query, fields="id, name")
+
+    if not folders:
+        print(f"[DRIVE] ⚠️ Pasta '{folder_name}' não encontrada no Google Drive")
+        return []
+
+    folder_id = folders[0]['id']
+    print(f"[DRIVE] 📁 Pasta encontrada: {folder_name} (ID: {folder_id})")
+
+    sheets_query = f"'{folder_id}' in parents and mimeType='{MIME_PLANILHA}' and trashed=false"
+    return resolvedor_drive.listar(drive_service, sheets_query, fields="id, name, modifiedTime")
+
 def list_google_sheets_in_drive(drive_service, folder_name="RelatorioVeri"):
     """Lista todos os Google Sheets em uma pasta específica do Drive"""
     try:
-        # Busca a pasta no Drive
-        folder_query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder'"
-        folder_results = drive_service.files().list(q=folder_query, fields="files(id, name)").execute()
-        folders = folder_results.get('files', [])
-
-        if not folders:
-            print(f"[DRIVE] ⚠️ Pasta '{folder_name}' não encontrada no Google Drive")
-            return []
-
-        folder_id = folders[0]['id']
-        print(f"[DRIVE] 📁 Pasta encontrada: {folder_name} (ID: {folder_id})")
-
-        # Lista todos os Google Sheets na pasta
-        sheets_query = f"'{folder_id}' in parents and mimeType='application/vnd.google-apps.spreadsheet'"
-        sheets_results = drive_service.files().list(
-            q=sheets_query,
-            fields="files(id, name, modifiedTime)",
-            pageSize=100
-        ).execute()
-        sheets = sheets_results.get('files', [])
+        if folder_name == indice_relatorioveri.nome_pasta:
+            # Delta da Changes API sobre o índice local (uma chamada quando nada mudou). Sempre
+            # consultado aqui: o modifiedTime de cada planilha decide o uso do cache do passo 1
+            if not resolvedor_drive.sincronizar(drive_service, forcar=True):
+                return []
+            sheets = indice_relatorioveri.arquivos(MIME_PLANILHA)
+        else:
+            sheets = _listar_google_sheets_da_pasta(drive_service, folder_name)
 
         print(f"[DRIVE] 📋 Encontrados {len(sheets)} Google Sheets na pasta")
 
@@ -447,94 +451,281 @@ def list_google_sheets_in_drive(drive_service, folder_name="RelatorioVeri"):
         print(f"[DRIVE] ⚠️ Erro ao listar sheets da pasta: {str(e)}")
         return []
 
-def read_google_sheet(sheets_service, sheet_id, sheet_name):
-    """Lê dados de um Google Sheet pelo ID usando Google Sheets API (OAuth)"""
-    try:
-        print(f"[DRIVE]   📖 Abrindo Google Sheet: {sheet_name}")
-        
-        # Obtém metadados da planilha (lista de abas)
-        spreadsheet = sheets_service.spreadsheets().get(spreadsheetId=sheet_id).execute()
-        sheets = spreadsheet.get('sheets', [])
-        
-        if not sheets:
-            print(f"[DRIVE]   ❌ Nenhuma aba encontrada em {sheet_name}")
+# Abas de cada planilha (propriedades: title, gridProperties), por ID do Sheets: sheet_id ->
+# (modifiedTime, abas). Evita a chamada de metadados nas leituras seguintes enquanto a planilha
+# não muda no Drive (abas novas/renomeadas, rowCount maior); a entrada é descartada se a leitura
+# com ela falhar. Sem modifiedTime conhecido o cache não é usado.
+_cache_abas_planilhas = {}
+_cache_abas_lock = threading.Lock()
+
+def _range_aba(titulo, colunas='A:Z'):
+    """Notação A1 para uma aba (aspas simples do título escapadas)"""
+    return "'{}'!{}".format(titulo.replace("'", "''"), colunas)
+
+def _abas_em_cache(sheet_id, modified_time):
+    """Abas em cache para a versão `modified_time` da planilha (None se ausente ou desatualizada)"""
+    if modified_time is None:
+        return None
+    with _cache_abas_lock:
+        em_cache = _cache_abas_planilhas.get(sheet_id)
+    if em_cache is None or em_cache[0] != modified_time:
+        return None
+    return em_cache[1]
+
+def listar_abas_planilha(sheets_service, sheet_id, sheet_name="", modified_time=None):
+    """Propriedades das abas da planilha (só title e gridProperties), com cache por (ID, modifiedTime)"""
+    abas = _abas_em_cache(sheet_id, modified_time)
+    if abas is not None:
+        return abas
+    
+    spreadsheet = executar_com_cota(sheets_service.spreadsheets().get(
+        spreadsheetId=sheet_id,
+        fields='sheets.properties(title,gridProperties)'
+    ), descricao=sheet_name)
+    abas = [s.get('properties', {}) for s in spreadsheet.get('sheets', [])]
+    with _cache_abas_lock:
+        _cache_abas_planilhas[sheet_id] = (modified_time, abas)
+    return abas
+
+def _esquecer_abas_planilha(sheet_id):
+    with _cache_abas_lock:
+        _cache_abas_planilhas.pop(sheet_id, None)
+
+def _mapear_colunas_necessarias(cabecalho):
+    """
+    {coluna do compilado: índice (0 = A) na aba} para as REQUIRED_COLUMNS presentes no cabeçalho
+    (primeira ocorrência). Aceita 'ID' como 'Identificador', como select_required_columns.
+    """
+    posicoes = {}
+    for i, nome in enumerate(cabecalho):
+        if nome in REQUIRED_COLUMNS and nome not in posicoes:
+            posicoes[nome] = i
+    if 'Identificador' not in posicoes and 'ID' in cabecalho:
+        posicoes['Identificador'] = cabecalho.index('ID')
+    return posicoes
+
+def _faixas_de_colunas(indices):
+    """Agrupa índices de coluna em faixas contíguas [(início, fim)] para pedir menos ranges"""
+    faixas = []
+    for i in sorted(set(indices)):
+        if faixas and faixas[-1][1] == i - 1:
+            faixas[-1] = (faixas[-1][0], i)
+        else:
+            faixas.append((i, i))
+    return faixas
+
+def _ler_colunas_aba(sheets_service, sheet_id, titulo, posicoes, sheet_name="", linhas=None, ordem=None):
+    """
+    Lê só as colunas mapeadas (majorDimension=COLUMNS, um range por faixa contígua) em um
+    único batchGet. Retorna DataFrame com as colunas na ordem de `ordem` (padrão: REQUIRED_COLUMNS).
+    `linhas`: (primeira, última, completar) em numeração da planilha, última None = até o fim da
+    aba; `linhas` None = coluna inteira sem o cabeçalho. Com `completar`, o resultado tem sempre
+    última - primeira + 1 linhas.
+    """
+    faixas = _faixas_de_colunas(posicoes.values())
+    primeira, ultima, completar = linhas if linhas else ('', '', False)
+    if ultima is None:
+        ultima = ''
+    result = executar_com_cota(sheets_service.spreadsheets().values().batchGet(
+        spreadsheetId=sheet_id,
+        ranges=[_range_aba(titulo, f"{get_column_letter(ini + 1)}{primeira}:{get_column_letter(fim + 1)}{ultima}")
+                for ini, fim in faixas],
+        majorDimension='COLUMNS'
+    ), descricao=sheet_name)
+    
+    # Valores de cada coluna da aba (índice -> lista); colunas vazias no fim da faixa não vêm
+    colunas = {}
+    for (ini, fim), value_range in zip(faixas, result.get('valueRanges', [])):
+        for deslocamento, valores in enumerate(value_range.get('values', [])):
+            colunas[ini + deslocamento] = valores if linhas else valores[1:]
+    
+    n_linhas = max((len(v) for v in colunas.values()), default=0)
+    if completar:
+        n_linhas = ultima - primeira + 1
+    dados = {}
+    for nome in [c for c in (ordem or REQUIRED_COLUMNS) if c in posicoes]:
+        valores = colunas.get(posicoes[nome], [])
+        # Células vazias no fim da coluna não vêm na resposta: completa com None (como linhas curtas na leitura por linha)
+        dados[nome] = valores + [None] * (n_linhas - len(valores))
+    return pd.DataFrame(dados)
+
+# Abas com mais linhas que isso (gridProperties.rowCount) são lidas em fatias de linhas em paralelo
+DRIVE_FATIA_LINHAS = int(os.getenv('DRIVE_FATIA_LINHAS', '20000'))
+DRIVE_FATIA_WORKERS = int(os.getenv('DRIVE_FATIA_WORKERS', '4'))
+
+def _ler_colunas_aba_em_fatias(sheet_id, titulo, posicoes, total_linhas, sheet_name=""):
+    """
+    Lê as colunas mapeadas de uma aba grande em fatias de DRIVE_FATIA_LINHAS linhas, em paralelo
+    (cada fatia passa pelo limitador de cota e usa o cliente Sheets da sua thread) e junta com
+    um único concat, na ordem das linhas.
+    """
+    fatias = []
+    for primeira in range(2, total_linhas + 1, DRIVE_FATIA_LINHAS):
+        ultima = primeira + DRIVE_FATIA_LINHAS - 1
+        # Todas as fatias menos a última têm tamanho fixo, para as linhas não se deslocarem. A última
+        # vai até o fim da aba (sem linha final): se a planilha cresceu depois do rowCount lido, as
+        # linhas novas ainda entram
+        fatias.append((primeira, ultima, True) if ultima < total_linhas else (primeira, None, False))
+    print(f"[DRIVE]     🧩 Aba '{titulo}' com {total_linhas} linhas: lendo em {len(fatias)} fatias")
+    
+    def _ler(linhas):
+        return _ler_colunas_aba(get_authenticated_sheets_service(), sheet_id, titulo, posicoes, sheet_name, linhas)
+    
+    with ThreadPoolExecutor(max_workers=max(1, DRIVE_FATIA_WORKERS), thread_name_prefix='drive-fatia') as pool:
+        partes = list(pool.map(_ler, fatias))
+    df = pd.concat(partes, ignore_index=True)
+    
+    # rowCount inclui linhas vazias do fim da grade: as fatias completadas deixam linhas só com None
+    # no fim. Corta até a última linha com algum valor (como na leitura da coluna inteira)
+    preenchidas = np.flatnonzero((df.notna() & df.ne('')).any(axis=1).to_numpy())
+    return df.iloc[:preenchidas[-1] + 1 if len(preenchidas) else 0].reset_index(drop=True)
+
+def read_google_sheet(sheets_service, sheet_id, sheet_name, modified_time=None):
+    """
+    Lê dados de um Google Sheet pelo ID usando Google Sheets API (OAuth).
+    Primeiro os cabeçalhos de todas as abas (um batchGet da linha 1); depois, na primeira aba com
+    colunas necessárias, só essas colunas. Retorna apenas as REQUIRED_COLUMNS encontradas.
+    `modified_time` (da listagem do Drive) valida a lista de abas em cache.
+    """
+    print(f"[DRIVE]   📖 Abrindo Google Sheet: {sheet_name}")
+    
+    for tentativa in (1, 2):
+        em_cache = _abas_em_cache(sheet_id, modified_time) is not None
+        try:
+            abas = listar_abas_planilha(sheets_service, sheet_id, sheet_name, modified_time)
+            titulos = [aba.get('title') for aba in abas if aba.get('title')]
+            
+            if not titulos:
+                print(f"[DRIVE]   ❌ Nenhuma aba encontrada em {sheet_name}")
+                _esquecer_abas_planilha(sheet_id)
+                return None
+            
+            cabecalhos = executar_com_cota(sheets_service.spreadsheets().values().batchGet(
+                spreadsheetId=sheet_id,
+                ranges=[_range_aba(t, '1:1') for t in titulos]
+            ), descricao=sheet_name)
+            
+            for titulo, value_range in zip(titulos, cabecalhos.get('valueRanges', [])):
+                cabecalho = (value_range.get('values') or [[]])[0]
+                posicoes = _mapear_colunas_necessarias(cabecalho)
+                if not posicoes:
+                    continue
+                
+                total_linhas = next((aba.get('gridProperties', {}).get('rowCount', 0)
+                                     for aba in abas if aba.get('title') == titulo), 0)
+                if total_linhas > DRIVE_FATIA_LINHAS:
+                    df = _ler_colunas_aba_em_fatias(sheet_id, titulo, posicoes, total_linhas, sheet_name)
+                else:
+                    df = _ler_colunas_aba(sheets_service, sheet_id, titulo, posicoes, sheet_name)
+                if len(df) > 0:  # Pelo menos cabeçalho + 1 linha
+                    print(f"[DRIVE]     ✅ Sucesso! {len(df)} linhas lidas da aba '{titulo}' ({len(posicoes)} colunas)")
+                    return df
+            
+            print(f"[DRIVE]   ❌ Nenhuma aba válida encontrada em {sheet_name}")
             return None
         
-        # Tenta ler cada aba até encontrar dados válidos
-        for i, sheet_meta in enumerate(sheets):
-            sheet_title = sheet_meta.get('properties', {}).get('title')
+        except Exception as e:
+            # Abas em cache podem estar desatualizadas (aba renomeada/removida): busca de novo uma vez
+            _esquecer_abas_planilha(sheet_id)
+            if em_cache and tentativa == 1:
+                print(f"[DRIVE]   ⚠️ Lista de abas em cache inválida para {sheet_name}, recarregando...")
+                continue
+            print(f"[DRIVE]   ❌ Erro ao ler {sheet_name}: {str(e)}")
+            return None
+
+# Leitura concorrente das planilhas do Drive (passo 1): poucas threads, todas atrás do mesmo
+# limitador de cota (google_quota); o cliente Sheets é compartilhado, com conexão HTTP própria por thread
+DRIVE_LEITURA_WORKERS = int(os.getenv('DRIVE_LEITURA_WORKERS', '4'))
+
+# Planilhas do Drive já limpas, por (ID, modifiedTime) - ver flask_app/cache_ingestao.py
+cache_ingestao = CacheIngestao()
+
+def ler_planilhas_drive_concorrente(sheets_info, max_workers=DRIVE_LEITURA_WORKERS):
+    """
+    Lê as planilhas do Drive em paralelo e entrega (índice, sheet_info, df) à medida que cada
+    leitura termina (df = None em caso de falha). O índice é a posição em `sheets_info`,
+    para o chamador poder manter a ordem original.
+    """
+    def _ler(sheet_info):
+        return read_google_sheet(get_authenticated_sheets_service(), sheet_info['id'], sheet_info['name'],
+                                 sheet_info.get('modifiedTime'))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='drive-leitura') as pool:
+        futuros = {pool.submit(_ler, info): (i, info) for i, info in enumerate(sheets_info)}
+        for futuro in as_completed(futuros):
+            i, info = futuros[futuro]
             try:
-                print(f"[DRIVE]     📄 Tentando aba {i+1}: {sheet_title}")
-                
-                # Lê os dados da aba
-                range_name = f"'{sheet_title}'!A:Z"
-                result = sheets_service.spreadsheets().values().get(
-                    spreadsheetId=sheet_id,
-                    range=range_name
-                ).execute()
-                
-                values = result.get('values', [])
-                
-                if values and len(values) > 1:  # Pelo menos cabeçalho + 1 linha
-                    df = pd.DataFrame(values[1:], columns=values[0])
-                    print(f"[DRIVE]     ✅ Sucesso! {len(df)} linhas lidas da aba '{sheet_title}'")
-                    return df
-                    
+                df = futuro.result()
             except Exception as e:
-                print(f"[DRIVE]     ⚠️ Erro na aba {sheet_title}: {str(e)}")
-                continue
-        
-        print(f"[DRIVE]   ❌ Nenhuma aba válida encontrada em {sheet_name}")
-        return None
-        
-    except Exception as e:
-        print(f"[DRIVE]   ❌ Erro ao ler {sheet_name}: {str(e)}")
+                print(f"[DRIVE]   ❌ Erro ao ler {info['name']}: {str(e)}")
+                df = None
+            yield i, info, df
+
+def _buscar_ou_criar_pasta_saidas(drive_service):
+    """ID da pasta 'saidas' dentro de RelatorioVeri (pelo índice local); cria se não existir"""
+    if not resolvedor_drive.sincronizar(drive_service):
+        print("[GOOGLE DRIVE] ⚠️ Pasta 'RelatorioVeri' não encontrada")
         return None
+    
+    saidas = indice_relatorioveri.buscar(nome='saidas', mime_type=MIME_PASTA)
+    if saidas:
+        return saidas['id']
+    
+    # Se não existir, cria a pasta
+    print("[GOOGLE DRIVE] 📁 Criando pasta 'saidas'...")
+    file_metadata = {
+        'name': 'saidas',
+        'mimeType': MIME_PASTA,
+        'parents': [indice_relatorioveri.pasta_id]
+    }
+    folder = drive_service.files().create(body=file_metadata, fields='id, name, mimeType, modifiedTime, parents').execute()
+    indice_relatorioveri.registrar(folder)
+    saidas_id = folder.get('id')
+    print(f"[GOOGLE DRIVE] ✅ Pasta 'saidas' criada: {saidas_id}")
+    return saidas_id
 
 def get_saidas_folder_id():
-    """Encontra ou cria a pasta 'saidas' no Google Drive"""
+    """Encontra ou cria a pasta 'saidas' no Google Drive (ID reaproveitado dentro do TTL)"""
     try:
-        drive_service, _ = init_google_drive()
+        drive_service = get_authenticated_drive_service()
         if not drive_service:
             return None
-        
-        # Busca pasta RelatorioVeri
-        folder_query = "name='RelatorioVeri' and mimeType='application/vnd.google-apps.folder' and trashed=false"
-        folder_results = drive_service.files().list(q=folder_query, fields="files(id, name)").execute()
-        folders = folder_results.get('files', [])
-        
-        if not folders:
-            print("[GOOGLE DRIVE] ⚠️ Pasta 'RelatorioVeri' não encontrada")
-            return None
-        
-        relatorio_veri_id = folders[0]['id']
-        
-        # Busca pasta 'saidas' dentro de RelatorioVeri
-        saidas_query = f"name='saidas' and '{relatorio_veri_id}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
-        saidas_results = drive_service.files().list(q=saidas_query, fields="files(id, name)").execute()
-        saidas_folders = saidas_results.get('files', [])
-        
-        if saidas_folders:
-            return saidas_folders[0]['id']
-        
-        # Se não existir, cria a pasta
-        print("[GOOGLE DRIVE] 📁 Criando pasta 'saidas'...")
-        file_metadata = {
-            'name': 'saidas',
-            'mimeType': 'application/vnd.google-apps.folder',
-            'parents': [relatorio_veri_id]
-        }
-        folder = drive_service.files().create(body=file_metadata, fields='id').execute()
-        saidas_id = folder.get('id')
-        print(f"[GOOGLE DRIVE] ✅ Pasta 'saidas' criada: {saidas_id}")
-        return saidas_id
+        return resolvedor_drive.resolver('saidas', lambda: _buscar_ou_criar_pasta_saidas(drive_service))
     
     except Exception as e:
         print(f"[GOOGLE DRIVE] ❌ Erro ao buscar pasta saidas: {str(e)}")
         return None
 
-def upload_to_drive(local_filepath, filename):
-    """Faz upload do arquivo para Google Drive usando OAuth"""
+# Uploads para o Drive: arquivos a partir deste tamanho vão em upload resumível, em blocos de
+# UPLOAD_BLOCO_MB (múltiplo de 256KB); um bloco que falha é reenviado sem recomeçar o arquivo
+UPLOAD_RESUMIVEL_MIN_BYTES = int(os.getenv('UPLOAD_RESUMIVEL_MIN_MB', '5')) * 1024 * 1024
+UPLOAD_BLOCO_BYTES = int(os.getenv('UPLOAD_BLOCO_MB', '8')) * 1024 * 1024
+UPLOAD_TENTATIVAS_BLOCO = 5
+
+_MIMETYPES_UPLOAD = {
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.csv': 'text/csv',
+}
+
+def _apagar_arquivos_em_lote(drive_service, arquivos, filename):
+    """Apaga vários arquivos do Drive em uma única requisição HTTP (batch)"""
+    def _resultado(request_id, response, exception):
+        # 404: a duplicata já foi apagada (listagem em cache); o chamador invalida a listagem
+        if exception is not None and getattr(getattr(exception, 'resp', None), 'status', None) != 404:
+            print(f"[GOOGLE DRIVE] ⚠️ Não foi possível apagar duplicata de {filename}: {str(exception)}")
+    
+    lote = drive_service.new_batch_http_request(callback=_resultado)
+    for arquivo in arquivos:
+        lote.add(drive_service.files().delete(fileId=arquivo['id']))
+    lote.execute()
+    print(f"[GOOGLE DRIVE] 🗑️ {len(arquivos)} duplicata(s) de {filename} removida(s)")
+
+def upload_to_drive(local_filepath, filename, ao_progredir=None):
+    """
+    Faz upload do arquivo para Google Drive usando OAuth. Se já existe um arquivo com esse nome na
+    pasta, o conteúdo dele é substituído (files().update), mantendo ID e link compartilhado.
+    `ao_progredir(fração)` é chamado a cada bloco enviado (e com 1.0 no fim).
+    """
     try:
         drive_service = get_authenticated_drive_service()
         if not drive_service:
@@ -547,28 +738,63 @@ def upload_to_drive(local_filepath, filename):
             print("[GOOGLE DRIVE] ❌ DRIVE_FOLDER_ID não configurado. Defina no .env ou no Render.")
             return None
         
-        # Verifica se já existe arquivo com mesmo nome e deleta
-        query = f"name='{filename}' and '{folder_id}' in parents and trashed=false"
-        results = drive_service.files().list(q=query, fields="files(id, name)").execute()
-        files = results.get('files', [])
-        
-        if files:
-            for file in files:
-                drive_service.files().delete(fileId=file['id']).execute()
-                print(f"[GOOGLE DRIVE] 🗑️ Arquivo antigo deletado: {filename}")
-        
-        # Faz upload do novo arquivo
-        file_metadata = {
-            'name': filename,
-            'parents': [folder_id]
-        }
+        # Arquivos com o mesmo nome na pasta (filtro por nome na própria query, cacheada por nome).
+        # O mais recente é atualizado no lugar (mesmo ID e link); os demais são duplicatas
+        nome_query = filename.replace("\\", "\\\\").replace("'", "\\'")
+        query = f"name='{nome_query}' and '{folder_id}' in parents and trashed=false"
+        mimetype = _MIMETYPES_UPLOAD.get(os.path.splitext(filename)[1].lower(), _MIMETYPES_UPLOAD['.xlsx'])
+        resumivel = os.path.getsize(local_filepath) >= UPLOAD_RESUMIVEL_MIN_BYTES
+        
+        for tentativa in (1, 2):
+            files = list(resolvedor_drive.listar(drive_service, query, fields="id, name, modifiedTime"))
+            files.sort(key=lambda f: f.get('modifiedTime', ''), reverse=True)
+            existente, duplicados = (files[0] if files else None), files[1:]
+            
+            if duplicados:
+                _apagar_arquivos_em_lote(drive_service, duplicados, filename)
+                resolvedor_drive.invalidar(query)
+            
+            if resumivel:
+                media = MediaFileUpload(local_filepath, mimetype=mimetype, chunksize=UPLOAD_BLOCO_BYTES, resumable=True)
+            else:
+                media = MediaFileUpload(local_filepath, mimetype=mimetype)
+            
+            if existente:
+                request_upload = drive_service.files().update(fileId=existente['id'], media_body=media, fields='id, webViewLink')
+            else:
+                file_metadata = {
+                    'name': filename,
+                    'parents': [folder_id]
+                }
+                request_upload = drive_service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink')
+            
+            try:
+                if resumivel:
+                    file = None
+                    while file is None:
+                        # num_retries: o bloco é reenviado (com backoff) em 5xx/429 e falhas de conexão
+                        status, file = request_upload.next_chunk(num_retries=UPLOAD_TENTATIVAS_BLOCO)
+                        if status and ao_progredir:
+                            ao_progredir(status.progress())
+                else:
+                    file = request_upload.execute()
+            except HttpError as e:
+                # Listagem em cache (TTL) com arquivo já apagado/na lixeira: relista uma vez e cria se preciso
+                if existente and tentativa == 1 and getattr(e.resp, 'status', None) == 404:
+                    print(f"[GOOGLE DRIVE] ⚠️ {filename} não existe mais no Drive (listagem em cache), listando de novo...")
+                    resolvedor_drive.invalidar(query)
+                    continue
+                raise
+            break
         
-        media = MediaFileUpload(local_filepath, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        file = drive_service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink').execute()
+        if ao_progredir:
+            ao_progredir(1.0)
+        if not existente:
+            resolvedor_drive.invalidar(query)
         
         file_id = file.get('id')
         link = file.get('webViewLink')
-        print(f"[GOOGLE DRIVE] ✅ Upload realizado: {filename}")
+        print(f"[GOOGLE DRIVE] ✅ Upload realizado ({'atualizado' if existente else 'novo'}): {filename}")
         print(f"[GOOGLE DRIVE] 🔗 Link: {link}")
         return file_id
     
@@ -607,30 +833,51 @@ def upload_all_reports_to_drive(timestamp):
             semanal_files.extend(glob.glob(os.path.join(saidas_path, f'RELATORIO_SEMANAL_*{ext}')))
         semanal_files = sorted(semanal_files, key=lambda x: os.path.getmtime(x), reverse=True)
         
+        # No Drive os arquivos têm nome fixo (sem timestamp): cada execução atualiza o mesmo
+        # arquivo no lugar (mesmo ID e link compartilhado) em vez de criar um novo
+        def _nome_drive(filepath, prefixo):
+            return prefixo + os.path.splitext(filepath)[1].lower()
+        
         files_to_upload = []
         
         if compilado_files:
-            files_to_upload.append((compilado_files[0], os.path.basename(compilado_files[0]), 'COMPILADO'))
+            files_to_upload.append((compilado_files[0], _nome_drive(compilado_files[0], 'COMPILADO'), 'COMPILADO'))
         else:
             print(f"[UPLOAD] ⚠️ Arquivo COMPILADO não encontrado para timestamp {timestamp}")
             
         if mensal_files:
-            files_to_upload.append((mensal_files[0], os.path.basename(mensal_files[0]), 'MENSAL'))
+            files_to_upload.append((mensal_files[0], _nome_drive(mensal_files[0], 'RELATORIO_MENSAL'), 'MENSAL'))
         if semanal_files:
-            files_to_upload.append((semanal_files[0], os.path.basename(semanal_files[0]), 'SEMANAL'))
+            files_to_upload.append((semanal_files[0], _nome_drive(semanal_files[0], 'RELATORIO_SEMANAL'), 'SEMANAL'))
+        
+        # Os arquivos sobem em paralelo; o progresso (etapa 3, de 88% a 99%) é a média dos arquivos
+        progresso_arquivos = {tipo: 0.0 for _, _, tipo in files_to_upload}
+        progresso_lock = threading.Lock()
+        
+        def _progresso(tipo):
+            def _atualizar(fracao):
+                with progresso_lock:
+                    progresso_arquivos[tipo] = fracao
+                    media = sum(progresso_arquivos.values()) / len(progresso_arquivos)
+                    atualizar_progresso(3, 88 + int(media * 11), f"Enviando {tipo} para o Google Drive: {int(fracao * 100)}%")
+            return _atualizar
+        
+        def _enviar(filepath, filename, tipo):
+            if not os.path.exists(filepath):
+                print(f"\n[UPLOAD] ⚠️ Arquivo não encontrado: {filepath}")
+                return {'sucesso': False, 'file_id': None}
+            print(f"\n[UPLOAD] 📤 Uploading {tipo}...")
+            print(f"[UPLOAD] Arquivo: {os.path.basename(filepath)} → {filename}")
+            file_id = upload_to_drive(filepath, filename, ao_progredir=_progresso(tipo))
+            print(f"[UPLOAD] {tipo}: {'✅' if file_id else '❌'}")
+            return {'sucesso': file_id is not None, 'file_id': file_id, 'filename': filename}
         
         results = {}
-        for filepath, filename, tipo in files_to_upload:
-            
-            if os.path.exists(filepath):
-                print(f"\n[UPLOAD] 📤 Uploading {tipo}...")
-                print(f"[UPLOAD] Arquivo: {filename}")
-                file_id = upload_to_drive(filepath, filename)
-                results[tipo] = {'sucesso': file_id is not None, 'file_id': file_id, 'filename': filename}
-                print(f"[UPLOAD] {tipo}: {'✅' if file_id else '❌'}")
-            else:
-                print(f"\n[UPLOAD] ⚠️ Arquivo não encontrado: {filepath}")
-                results[tipo] = {'sucesso': False, 'file_id': None}
+        if files_to_upload:
+            with ThreadPoolExecutor(max_workers=len(files_to_upload), thread_name_prefix='drive-upload') as pool:
+                futuros = {tipo: pool.submit(_enviar, filepath, filename, tipo) for filepath, filename, tipo in files_to_upload}
+                for tipo, futuro in futuros.items():
+                    results[tipo] = futuro.result()
         
         print("\n" + "="*80)
         print("[UPLOAD] ✅ Upload automático concluído!")
@@ -846,7 +1093,7 @@ def save_to_saidas(df, filename, apply_formatting=False):
         if len(df) > 30000:
             print(f"[SAIDAS] ⚠️ Arquivo grande ({len(df)} linhas), usando CSV para evitar timeout...")
             csv_filepath = filepath.replace('.xlsx', '.csv')
-            df[cols_to_export].to_csv(csv_filepath, index=False, encoding='utf-8-sig')
+            formatar_para_exportacao(df, cols_to_export).to_csv(csv_filepath, index=False, encoding='utf-8-sig')
             elapsed = time.time() - start_time
             print(f"[SAIDAS] ✅ Arquivo CSV salvo: {csv_filepath}")
             print(f"[SAIDAS] ⏱️ Tempo de salvamento: {elapsed:.2f}s")
@@ -856,7 +1103,7 @@ def save_to_saidas(df, filename, apply_formatting=False):
         # Salvar Excel normalmente para arquivos menores
         print(f"[SAIDAS] 💾 Iniciando escrita Excel...")
         with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-            df[cols_to_export].to_excel(writer, index=False, sheet_name='Dados')
+            formatar_para_exportacao(df, cols_to_export).to_excel(writer, index=False, sheet_name='Dados')
         
         elapsed = time.time() - start_time
         print(f"[SAIDAS] ✅ Arquivo Excel salvo: {filepath}")
@@ -883,7 +1130,7 @@ def save_to_saidas(df, filename, apply_formatting=False):
         try:
             print(f"[SAIDAS] 🔄 Excel falhou, tentando fallback para CSV...")
             csv_filepath = filepath.replace('.xlsx', '.csv')
-            df[cols_to_export].to_csv(csv_filepath, index=False, encoding='utf-8-sig')
+            formatar_para_exportacao(df, cols_to_export).to_csv(csv_filepath, index=False, encoding='utf-8-sig')
             print(f"[SAIDAS] ✅ Arquivo CSV salvo como fallback: {csv_filepath}")
             gc.collect()
             return csv_filepath
@@ -895,47 +1142,87 @@ def save_to_saidas(df, filename, apply_formatting=False):
 # FUNÇÕES DE LIMPEZA E PROCESSAMENTO
 # ==============================================================================
 
-def clean_price_value(price_str):
-    """Limpa um valor de preço individual"""
-    if pd.isna(price_str) or price_str == '':
-        return None
-
-    price_str = str(price_str).strip()
-    price_str = re.sub(r'^R\$\s*', '', price_str)
-    price_str = price_str.replace(' ', '')
-
-    if ',' in price_str and '.' in price_str:
-        price_str = price_str.replace('.', '').replace(',', '.')
-    elif ',' in price_str and '.' not in price_str:
-        price_str = price_str.replace(',', '.')
-
+def _strip_textos(serie):
+    """
+    serie.str.strip() que devolve NaN para os valores que não são string (números, datas, nulos),
+    inclusive quando a coluna object não tem nenhuma string (onde o acessor .str levanta erro).
+    """
     try:
-        return float(price_str)
-    except:
-        return None
+        return serie.str.strip()
+    except AttributeError:
+        return pd.Series(np.nan, index=serie.index, dtype=object)
 
-def clean_dataframe(df):
-    """Limpa o DataFrame removendo linhas vazias"""
+def clean_numeric_column(serie, ponto_milhar=False):
+    """
+    Converte uma coluna inteira de números/moeda em formato brasileiro para float, com operações
+    vetorizadas de string. Aceita "R$ 1.234,56", "1234,5", vazios (-> NaN) e valores que já são números.
+    
+    - ponto_milhar=False (Preço/PMM): o ponto só é separador de milhar quando há vírgula ("1.234,56");
+      "1234.5" continua 1234.5.
+    - ponto_milhar=True (porc/Universo do DadosIdentificador): o ponto é sempre separador de milhar.
+    
+    Colunas que já são numéricas não passam pelo parsing.
+    """
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return serie.astype('float64')
+    
+    # .str devolve NaN para o que não é string: separa textos de números/nulos sem apply por linha
+    texto = _strip_textos(serie.astype('object'))
+    eh_texto = texto.notna()
+    resultado = pd.to_numeric(serie.where(~eh_texto), errors='coerce').astype('float64')
+    if not eh_texto.any():
+        return resultado
+    
+    texto = texto[eh_texto].str.replace(r'^R\$', '', regex=True).str.replace(r'\s+', '', regex=True)
+    sem_milhar = texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    if not ponto_milhar:
+        texto = sem_milhar.where(texto.str.contains(',', regex=False), texto)
+    else:
+        texto = sem_milhar
+    resultado[eh_texto] = pd.to_numeric(texto, errors='coerce')
+    return resultado
+
+def clean_dataframe(df, remover_vazias=True):
+    """
+    Limpa o DataFrame removendo linhas vazias e linhas de TOTAL/RESUMO (uma única filtragem).
+    remover_vazias=False: só TOTAL/RESUMO (a ingestão em blocos já descarta as linhas vazias
+    olhando a linha inteira, antes de projetar nas REQUIRED_COLUMNS).
+    """
     if df is None or df.empty:
         return df
 
-    df = df.dropna(how='all')
-    df = df[df.apply(lambda x: x.astype(str).str.strip().ne('').any(), axis=1)]
+    # Máscara de "linha tem algum valor" montada coluna a coluna: nulos e strings só com espaços
+    # contam como vazio; qualquer outro valor (número, data, texto) conta como preenchido
+    if remover_vazias:
+        preenchida = np.zeros(len(df), dtype=bool)
+        for col in df.columns:
+            serie = df[col]
+            valida = serie.notna().to_numpy()
+            if serie.dtype == object or pd.api.types.is_string_dtype(serie):
+                texto = _strip_textos(serie)
+                valida &= (texto.isna() | texto.ne('')).to_numpy()
+            preenchida |= valida
+    else:
+        preenchida = np.ones(len(df), dtype=bool)
 
     if 'Rádio' in df.columns:
-        mask = ~df['Rádio'].str.contains('TOTAL|RESUMO', case=False, na=False)
-        df = df[mask]
+        try:
+            preenchida &= ~df['Rádio'].str.contains('TOTAL|RESUMO', case=False, na=False).to_numpy()
+        except AttributeError:
+            pass  # coluna Rádio sem nenhum texto: não há TOTAL/RESUMO para remover
 
-    return df
+    return df[preenchida]
+
+# Colunas do modelo veriRelatorioModelo mantidas no compilado
+REQUIRED_COLUMNS = ['Identificador', 'Data', 'Hora', 'Rádio', 'Cidade / UF',
+                    'Peça', 'Comercial', 'Status', 'PMM', 'Preço', 'Semana', 'Ano Comercial', 'Mês Comercial']
 
 def select_required_columns(df):
     """Seleciona apenas as colunas necessárias (modelo veriRelatorioModelo). Aceita 'ID' como 'Identificador'."""
-    required_columns = ['Identificador', 'Data', 'Hora', 'Rádio', 'Cidade / UF',
-                       'Peça', 'Comercial', 'Status', 'PMM', 'Preço', 'Semana', 'Ano Comercial', 'Mês Comercial']
     if 'Identificador' not in df.columns and 'ID' in df.columns:
         df = df.copy()
         df['Identificador'] = df['ID']
-    existing_columns = [col for col in required_columns if col in df.columns]
+    existing_columns = [col for col in REQUIRED_COLUMNS if col in df.columns]
     if not existing_columns:
         return pd.DataFrame()
     return df[existing_columns].copy()
@@ -943,22 +1230,33 @@ def select_required_columns(df):
 # Nomes aceitos para a coluna de percentual no DadosIdentificador (planilha pode usar % ou Percentual)
 _PORC_ALIASES = ('porc', 'perc', '%', 'percentual', 'participação', 'participacao')
 
-def _renomear_colunas_dados_id(df):
+# Colunas do DadosIdentificador usadas no merge do passo 1
+COLUNAS_DADOS_ID = ['Identificador', 'Universo', 'porc']
+
+def _mapear_colunas_dados_id(nomes):
     """
-    Alinha ao Colab: só renomeia colunas que batem por nome (strip+lower).
-    Identificador/ID, Universo, porc (ou perc, %, percentual) - primeira ocorrência de cada.
+    {coluna padrão: índice} por nome (strip+lower), primeira ocorrência de cada:
+    Identificador/ID, Universo, porc (ou perc, %, percentual).
     """
-    if df is None or df.empty:
-        return df
     found = {}
-    for c in df.columns:
+    for i, c in enumerate(nomes):
         k = str(c).strip().lower()
         if k in ('identificador', 'id') and 'Identificador' not in found:
-            found['Identificador'] = c
+            found['Identificador'] = i
         elif k == 'universo' and 'Universo' not in found:
-            found['Universo'] = c
+            found['Universo'] = i
         elif k in _PORC_ALIASES and 'porc' not in found:
-            found['porc'] = c
+            found['porc'] = i
+    return found
+
+def _renomear_colunas_dados_id(df):
+    """
+    Alinha ao Colab: só renomeia colunas que batem por nome (strip+lower).
+    Identificador/ID, Universo, porc (ou perc, %, percentual) - primeira ocorrência de cada.
+    """
+    if df is None or df.empty:
+        return df
+    found = {k: df.columns[i] for k, i in _mapear_colunas_dados_id(df.columns).items()}
     if found:
         df = df.rename(columns={v: k for k, v in found.items()})
     return df
@@ -987,87 +1285,168 @@ def _normalizar_identificador_para_merge(s):
         s = str(int(s)) if s.isdigit() else ('-' + str(int(s[1:])))
     return s
 
+def codificar_identificadores(serie):
+    """
+    Normaliza só os valores distintos da coluna e devolve (códigos, vocabulário): um código inteiro
+    denso por linha e o Identificador normalizado de cada código. Valores que normalizam igual
+    ('0123', '123.0', '123') ficam com o mesmo código; nulos viram ''.
+    """
+    codigos_brutos, unicos = pd.factorize(serie, use_na_sentinel=False)
+    normalizados = np.array([_normalizar_identificador_para_merge(v) for v in unicos], dtype=object)
+    codigos_unicos, vocabulario = pd.factorize(normalizados)
+    return codigos_unicos[codigos_brutos], np.asarray(vocabulario, dtype=object)
+
+def anexar_dados_identificador(unified_df, df_dados_id):
+    """
+    Anexa Universo e porc (já numéricos) ao compilado pelo Identificador normalizado, sem merge de
+    strings: cada linha do DadosIdentificador é posicionada no vocabulário de códigos do compilado
+    (primeira ocorrência vale) e as colunas são montadas por take. O Identificador do compilado sai
+    normalizado. Retorna (unified_df, linhas sem correspondência, identificadores sem correspondência).
+    """
+    codigos, vocabulario = codificar_identificadores(unified_df['Identificador'])
+    unified_df['Identificador'] = vocabulario.take(codigos)
+    
+    ids_dados = [_normalizar_identificador_para_merge(v) for v in df_dados_id['Identificador']]
+    posicoes = pd.Index(vocabulario).get_indexer(ids_dados)
+    # Duplicatas no DadosIdentificador: vale a primeira linha de cada Identificador
+    posicoes_validas, linhas = np.unique(posicoes, return_index=True)
+    if len(posicoes_validas) and posicoes_validas[0] == -1:
+        posicoes_validas, linhas = posicoes_validas[1:], linhas[1:]
+    
+    for col in [c for c in ('Universo', 'porc') if c in df_dados_id.columns]:
+        # A limpeza numérica roda só nas linhas do DadosIdentificador, não nas do compilado
+        valores = clean_numeric_column(df_dados_id[col], ponto_milhar=True).to_numpy()
+        por_codigo = np.full(len(vocabulario), np.nan)
+        por_codigo[posicoes_validas] = valores[linhas]
+        unified_df[col] = por_codigo.take(codigos)
+    
+    sem_correspondencia = np.ones(len(vocabulario), dtype=bool)
+    sem_correspondencia[posicoes_validas] = False
+    linhas_sem = int(np.count_nonzero(sem_correspondencia[codigos]))
+    return unified_df, linhas_sem, int(np.count_nonzero(sem_correspondencia))
+
+# DadosIdentificador (colunas lidas) em memória e em disco: só é relido do Sheets quando o
+# modifiedTime da planilha muda no Drive (e aí só as colunas Identificador, Universo e porc)
+cache_dados_identificador = CacheDadosIdentificador()
+
+def _modified_time_drive(file_id):
+    """modifiedTime do arquivo no Drive (None se não autenticado ou sem acesso)"""
+    drive_service = get_authenticated_drive_service()
+    if not drive_service:
+        return None
+    try:
+        return executar_com_cota(
+            drive_service.files().get(fileId=file_id, fields='modifiedTime'), limitador=None
+        ).get('modifiedTime')
+    except Exception as e:
+        print(f"[PASSO 1] ℹ️ modifiedTime do DadosIdentificador indisponível (cache ignorado): {str(e)}")
+        return None
+
+def _ler_dados_identificador_sheets(sheets_service, sheet_id, modified_time=None):
+    """
+    Lê do Sheets só Identificador/Universo/porc da primeira aba (cabeçalho + colunas), com os valores
+    como estão na planilha: a normalização do Identificador é feita só em anexar_dados_identificador.
+    Retorna (DataFrame ou None, título da aba).
+    """
+    abas = listar_abas_planilha(sheets_service, sheet_id, 'DadosIdentificador', modified_time)
+    if not abas:
+        return None, None
+    sheet_title = abas[0].get('title')
+    
+    cabecalho = executar_com_cota(sheets_service.spreadsheets().values().get(
+        spreadsheetId=sheet_id,
+        range=_range_aba(sheet_title, '1:1')
+    ), descricao='DadosIdentificador').get('values', [[]])[0]
+    posicoes = _mapear_colunas_dados_id(cabecalho)
+    if 'Identificador' not in posicoes:
+        print("[PASSO 1] ℹ️ Coluna 'Identificador' não encontrada em Google Sheets. Colunas lidas:", cabecalho)
+        return None, sheet_title
+    
+    df_dados_id = _ler_colunas_aba(sheets_service, sheet_id, sheet_title, posicoes,
+                                   'DadosIdentificador', ordem=COLUNAS_DADOS_ID)
+    if df_dados_id.empty:
+        return None, sheet_title
+    return df_dados_id, sheet_title
+
+def carregar_dados_identificador():
+    """
+    Tabela DadosIdentificador (Identificador, Universo, porc) do Google Sheets.
+    Retorna (DataFrame ou None, informações: sheet_id, modifiedTime, origem e aba).
+    """
+    sheet_id = resolvedor_drive.resolver('dados_identificador')
+    info = {'sheet_id': sheet_id, 'modified_time': None, 'origem': None, 'aba': None}
+    
+    sheets_service = get_authenticated_sheets_service()
+    if not sheets_service:
+        print("[PASSO 1] ⚠️ Não autenticado no Google Sheets")
+        return None, info
+    
+    modified_time = _modified_time_drive(sheet_id)
+    info['modified_time'] = modified_time
+    df_dados_id = cache_dados_identificador.carregar(sheet_id, modified_time)
+    if df_dados_id is not None:
+        info['origem'] = 'cache'
+        return df_dados_id, info
+    
+    df_dados_id, info['aba'] = _ler_dados_identificador_sheets(sheets_service, sheet_id, modified_time)
+    info['origem'] = 'sheets'
+    if df_dados_id is not None:
+        cache_dados_identificador.salvar(sheet_id, modified_time, df_dados_id)
+    return df_dados_id, info
+
 def extract_dados_identificador_from_google_sheets():
-    """Extrai DadosIdentificador do Google Sheets usando OAuth"""
+    """Extrai DadosIdentificador do Google Sheets usando OAuth (com cache por modifiedTime)"""
     try:
-        # ID da planilha DadosIdentificador
-        sheet_id = "1UmWzuIpF1nEh1YUJH4pu9jJL7PJHvlQvHE4Pnrw6xhA"
-        
         print("[PASSO 1] 📖 Carregando DadosIdentificador do Google Sheets...")
         
-        sheets_service = get_authenticated_sheets_service()
-        
-        if not sheets_service:
-            print("[PASSO 1] ⚠️ Não autenticado no Google Sheets")
-            return None
-        
         try:
-            # Obtém metadados da planilha
-            spreadsheet = sheets_service.spreadsheets().get(spreadsheetId=sheet_id).execute()
-            sheets_list = spreadsheet.get('sheets', [])
-            
-            if not sheets_list:
-                print("[PASSO 1] ℹ️ Google Sheets vazio")
-                return None
-            
-            # Lê a primeira aba
-            sheet_title = sheets_list[0].get('properties', {}).get('title')
-            range_name = f"'{sheet_title}'!A:Z"
-            result = sheets_service.spreadsheets().values().get(
-                spreadsheetId=sheet_id,
-                range=range_name
-            ).execute()
-            
-            values = result.get('values', [])
-            
-            if not values or len(values) < 2:
-                print("[PASSO 1] ℹ️ Google Sheets vazio")
-                return None
-            
-            # Primeira linha = cabeçalho, resto = dados (igual ao Colab)
-            df_dados_id = pd.DataFrame(values[1:], columns=values[0])
-            df_dados_id = _renomear_colunas_dados_id(df_dados_id)
-            merge_columns = ['Identificador', 'Universo', 'porc']
-            existing_cols = [col for col in merge_columns if col in df_dados_id.columns]
-            
-            if 'Identificador' not in existing_cols:
-                print("[PASSO 1] ℹ️ Coluna 'Identificador' não encontrada em Google Sheets. Colunas lidas:", list(df_dados_id.columns))
-                return None
-            
-            print(f"[PASSO 1] ✅ DadosIdentificador carregado: {len(df_dados_id)} registros. Colunas: {existing_cols}")
-            if len(df_dados_id) > 0:
-                ex_id = df_dados_id['Identificador'].iloc[0]
-                print(f"[PASSO 1]    Exemplo Identificador no sheet: {repr(ex_id)}")
-            return df_dados_id[existing_cols].copy()
-            
+            df_dados_id, info = carregar_dados_identificador()
         except Exception as e:
             print(f"[PASSO 1] ℹ️ Erro ao ler Google Sheets: {str(e)}")
             return None
+        
+        if df_dados_id is None:
+            if info['origem']:
+                print("[PASSO 1] ℹ️ Google Sheets vazio")
+            return None
+        
+        existing_cols = list(df_dados_id.columns)
+        origem = 'cache, sem mudanças no Drive' if info['origem'] == 'cache' else 'Google Sheets'
+        print(f"[PASSO 1] ✅ DadosIdentificador carregado ({origem}): {len(df_dados_id)} registros. Colunas: {existing_cols}")
+        if len(df_dados_id) > 0:
+            ex_id = df_dados_id['Identificador'].iloc[0]
+            print(f"[PASSO 1]    Exemplo Identificador no sheet: {repr(ex_id)}")
+        return df_dados_id
     
     except Exception as e:
         print(f"[PASSO 1] ℹ️ Erro ao carregar DadosIdentificador: {str(e)}")
         return None
 
-def extract_dados_identificador(arquivo_path):
-    """Extrai DadosIdentificador do arquivo Excel ou Google Sheets"""
+def _localizar_aba_dados_identificador(sheet_names):
+    """Retorna o nome da aba DadosIdentificador (várias variações possíveis) ou None."""
+    for sheet_name in sheet_names:
+        if 'dadosidentificador' in sheet_name.lower().replace(' ', '').replace('_', ''):
+            return sheet_name
+    return None
+
+def extract_dados_identificador(fonte):
+    """
+    Extrai DadosIdentificador do arquivo Excel.
+    `fonte` pode ser o caminho do arquivo ou um pd.ExcelFile já aberto (sessão do job),
+    para não descompactar/parsear o XLSX outra vez.
+    """
+    xls = None
     try:
-        xls = pd.ExcelFile(arquivo_path)
+        xls = fonte if isinstance(fonte, pd.ExcelFile) else pd.ExcelFile(fonte)
         
-        # Procura pela aba DadosIdentificador (várias variações possíveis)
-        dados_id_sheet = None
-        for sheet_name in xls.sheet_names:
-            if 'dadosidentificador' in sheet_name.lower().replace(' ', '').replace('_', ''):
-                dados_id_sheet = sheet_name
-                break
+        dados_id_sheet = _localizar_aba_dados_identificador(xls.sheet_names)
         
         if not dados_id_sheet:
-            xls.close()
             print("[PASSO 1] ℹ️ DadosIdentificador não encontrado - Universo=0, PMM no Target=0")
             return None
         
-        # Lê a aba DadosIdentificador
-        df_dados_id = pd.read_excel(arquivo_path, sheet_name=dados_id_sheet)
-        xls.close()
+        # Lê a aba DadosIdentificador (reaproveita o workbook já carregado)
+        df_dados_id = xls.parse(dados_id_sheet)
         
         df_dados_id = _normalizar_colunas_dados_identificador(df_dados_id)
         if df_dados_id is None:
@@ -1094,53 +1473,79 @@ def extract_dados_identificador(arquivo_path):
     except Exception as e:
         print(f"[PASSO 1] ⚠️ Erro ao ler DadosIdentificador: {str(e)}")
         return None
+    finally:
+        # Só fecha se a sessão foi aberta aqui; a sessão do job é fechada pelo passo 1
+        if xls is not None and xls is not fonte:
+            xls.close()
+
+def parse_data_column(serie):
+    """Garante a coluna Data em datetime64; texto (ex: compilado lido do disco) é lido como 'dd/mm/YYYY'"""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    return pd.to_datetime(serie, format='%d/%m/%Y', errors='coerce')
+
+def parse_hora_column(serie):
+    """
+    Converte a coluna Hora para timedelta64 (horário do dia). Aceita datetime.time do Excel,
+    "14:30", "14:30:00" e "14:30:00.0"; o que não tiver horário vira NaT.
+    Só os valores únicos são interpretados (os horários se repetem muito entre as linhas).
+    """
+    if pd.api.types.is_timedelta64_dtype(serie):
+        return serie
+    codigos, unicos = pd.factorize(serie)
+    texto = pd.Series(unicos, dtype=object).astype(str).str.extract(r'(\d{1,2}:\d{2}(?::\d{2})?)', expand=False)
+    texto = texto.where(texto.str.count(':') != 1, texto + ':00')
+    horas = pd.to_timedelta(texto, errors='coerce').to_numpy()
+    horas = np.append(horas, np.timedelta64('NaT', 'ns'))  # posição -1 = nulos
+    return pd.Series(horas[codigos], index=serie.index, dtype='timedelta64[ns]')
+
+def formatar_hora(serie):
+    """timedelta64 -> 'HH:MM:SS' ('' para NaT)"""
+    return (pd.Timestamp('1900-01-01') + serie).dt.strftime('%H:%M:%S').fillna('')
+
+def formatar_para_exportacao(df, colunas=None):
+    """
+    Converte Data/Hora tipadas em texto ('dd/mm/YYYY' e 'HH:MM:SS') só para escrever o arquivo.
+    Retorna um novo DataFrame com as `colunas` pedidas, sem copiar as demais.
+    """
+    colunas = list(df.columns) if colunas is None else colunas
+    dados = {col: df[col] for col in colunas}
+    if 'Data' in dados and pd.api.types.is_datetime64_any_dtype(dados['Data']):
+        dados['Data'] = dados['Data'].dt.strftime('%d/%m/%Y').fillna('')
+    if 'Hora' in dados and pd.api.types.is_timedelta64_dtype(dados['Hora']):
+        dados['Hora'] = formatar_hora(dados['Hora'])
+    return pd.DataFrame(dados, columns=colunas, copy=False)
 
 def process_data_types(df):
     """Formata os tipos de dados"""
     if df.empty:
         return df
 
-    # Formata Data
+    # Data como datetime64 (a formatação 'dd/mm/YYYY' só acontece na escrita do arquivo)
     if 'Data' in df.columns:
         try:
             df['Data'] = pd.to_datetime(df['Data'], errors='coerce', dayfirst=True)
-            df['Data'] = df['Data'].dt.strftime('%d/%m/%Y')
         except:
             pass
 
-    # Formata Hora
+    # Hora como timedelta64 (horário do dia)
     if 'Hora' in df.columns:
         try:
-            df['Hora'] = df['Hora'].astype(str).str.strip()
-            df['Hora'] = df['Hora'].str.replace(r'\.\d+$', '', regex=True)
-
-            def normalize_hora(hora_str):
-                if pd.isna(hora_str) or str(hora_str).strip() == '':
-                    return ''
-                hora_str = str(hora_str).strip()
-                if len(hora_str.split(':')) == 3:
-                    return hora_str
-                elif len(hora_str.split(':')) == 2:
-                    return hora_str + ':00'
-                else:
-                    return hora_str
-
-            df['Hora'] = df['Hora'].apply(normalize_hora)
+            df['Hora'] = parse_hora_column(df['Hora'])
         except:
             pass
 
     # Converte PMM
     if 'PMM' in df.columns:
         try:
-            df['PMM'] = df['PMM'].astype(str).str.replace(',', '.')
-            df['PMM'] = pd.to_numeric(df['PMM'], errors='coerce')
+            df['PMM'] = clean_numeric_column(df['PMM'])
         except:
             pass
 
     # Converte Preço
     if 'Preço' in df.columns:
         try:
-            df['Preço'] = df['Preço'].apply(clean_price_value)
+            df['Preço'] = clean_numeric_column(df['Preço'])
         except:
             pass
 
@@ -1154,37 +1559,11 @@ def calculate_mes_comercial(df):
     try:
         print("[PROCESSAMENTO] 📅 Atualizando Mês Comercial (Calendário 2026)...")
         
-        # Definição do Calendário Comercial 2026
-        # (Mês, Data Início, Data Fim)
-        calendar_2026 = [
-            ('Janeiro', '2025-12-29', '2026-01-25'),
-            ('Fevereiro', '2026-01-26', '2026-02-22'),
-            ('Março', '2026-02-23', '2026-03-29'),
-            ('Abril', '2026-03-30', '2026-04-26'),
-            ('Maio', '2026-04-27', '2026-05-24'),
-            ('Junho', '2026-05-25', '2026-06-28'),
-            ('Julho', '2026-06-29', '2026-07-26'),
-            ('Agosto', '2026-07-27', '2026-08-30'),
-            ('Setembro', '2026-08-31', '2026-09-27'),
-            ('Outubro', '2026-09-28', '2026-10-25'),
-            ('Novembro', '2026-10-26', '2026-11-29'),
-            ('Dezembro', '2026-11-30', '2026-12-27')
-        ]
-        
-        # Converter para datetime temporariamente para comparação
-        # A coluna Data está em string 'dd/mm/yyyy'
-        temp_dates = pd.to_datetime(df['Data'], format='%d/%m/%Y', errors='coerce')
-        
-        # Cria nova série para o mês
-        meses_comerciais = pd.Series(index=df.index, dtype='object')
+        # A coluna Data já chega em datetime64 (process_data_types)
+        temp_dates = parse_data_column(df['Data'])
         
-        for mes, start, end in calendar_2026:
-            start_dt = pd.to_datetime(start)
-            end_dt = pd.to_datetime(end)
-            
-            # Máscara para datas dentro do range
-            mask = (temp_dates >= start_dt) & (temp_dates <= end_dt)
-            meses_comerciais[mask] = mes
+        # Rotula todas as datas de uma vez pelo índice do calendário (None fora de 2026)
+        meses_comerciais = CALENDARIO_MESES_2026.rotular(temp_dates)
             
         # Atualiza o DataFrame (onde houve match)
         # Se não houve match (fora de 2026), mantemos o valor original se existir, ou vazio
@@ -1202,8 +1581,53 @@ def calculate_mes_comercial(df):
         
     return df
 
+# Coluna interna com o hash 64-bit da chave de deduplicação de cada linha. Fica nos DataFrames
+# de cada fonte para a passada global (após o concat) só comparar hashes; é removida antes de salvar.
+COLUNA_HASH_DEDUP = '_hash_dedup'
+_COLUNAS_CHAVE_DEDUP = ['Identificador', 'Data', 'Hora', 'Semana', 'Ano Comercial', 'Mês Comercial']
+_HASH_VALOR_AUSENTE = pd.util.hash_array(np.array(['NAN'], dtype=object))[0]
+# Textos tratados como ausentes (como o 'VAZIO' da chave de texto antiga): '', 'nan', 'None'
+_TEXTOS_AUSENTES = ('', 'NAN', 'NONE')
+
+def _hash_coluna_chave(serie, coluna):
+    """
+    Hash uint64 por linha do valor normalizado (strip/upper; Hora sem espaços e sem fração de segundo;
+    nulos e textos vazios/'nan'/'None' com um único hash).
+    Só os valores únicos são normalizados e o hash é do valor, não do código, para ser comparável
+    entre DataFrames diferentes. Datas/horas tipadas entram direto pelo valor int64.
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie) or pd.api.types.is_timedelta64_dtype(serie):
+        return pd.util.hash_array(serie.to_numpy().view('i8'))
+    
+    codigos, unicos = pd.factorize(serie)
+    texto = pd.Series(unicos, dtype=object).astype(str).str.strip().str.upper()
+    if coluna in ('Data', 'Hora'):
+        texto = texto.str.replace(' ', '', regex=False)
+    if coluna == 'Hora':
+        texto = texto.str.replace(r'\.\d+$', '', regex=True)
+    # '', 'nan' e 'None' contam como o mesmo valor ausente dos nulos; última posição = nulos
+    # (código -1 do factorize)
+    hashes = pd.util.hash_array(texto.to_numpy(dtype=object))
+    hashes[texto.isin(_TEXTOS_AUSENTES).to_numpy()] = _HASH_VALOR_AUSENTE
+    return np.append(hashes, _HASH_VALOR_AUSENTE)[codigos]
+
+def calcular_hash_linhas(df):
+    """Combina os hashes das colunas-chave em um único uint64 por linha (coluna ausente = nula)"""
+    resultado = np.full(len(df), 0x345678, dtype=np.uint64)
+    for col in _COLUNAS_CHAVE_DEDUP:
+        if col in df.columns:
+            valores = _hash_coluna_chave(df[col], col)
+        else:
+            valores = np.full(len(df), _HASH_VALOR_AUSENTE, dtype=np.uint64)
+        resultado = (resultado ^ valores) * np.uint64(1000003)
+    return resultado
+
 def remove_duplicates_properly(df):
-    """Remove duplicatas de forma eficiente em termos de memória"""
+    """
+    Remove duplicatas pela chave Identificador + Data + Hora (+ Semana/Ano/Mês Comercial) usando um
+    hash 64-bit por linha, sem colunas temporárias de texto. Se o DataFrame já traz COLUNA_HASH_DEDUP
+    de todas as linhas (ex: concat das fontes já deduplicadas), o hash é reaproveitado.
+    """
     if df is None or df.empty:
         return df, 0
 
@@ -1213,45 +1637,166 @@ def remove_duplicates_properly(df):
     if not all(col in df.columns for col in required_cols):
         return df, 0
 
-    # Usamos colunas temporárias diretamente no DataFrame original para evitar df.copy()
-    temp_cols = []
-    
-    # 1. Identificador
-    df['Identificador_tmp'] = df['Identificador'].astype(str).str.strip().str.upper().replace(['', 'nan', 'None'], 'VAZIO')
-    temp_cols.append('Identificador_tmp')
-    
-    # 2. Data
-    if pd.api.types.is_datetime64_any_dtype(df['Data']):
-        temp_cols.append('Data')
+    if COLUNA_HASH_DEDUP in df.columns and df[COLUNA_HASH_DEDUP].dtype == np.uint64:
+        hashes = df[COLUNA_HASH_DEDUP].to_numpy()
     else:
-        df['Data_tmp'] = df['Data'].astype(str).str.strip().str.replace(' ', '').str.upper().replace(['', 'nan', 'None'], 'VAZIO')
-        temp_cols.append('Data_tmp')
-        
-    # 3. Hora
-    df['Hora_tmp'] = df['Hora'].astype(str).str.strip().str.replace(' ', '').str.upper()
-    df['Hora_tmp'] = df['Hora_tmp'].str.replace(r'\.\d+$', '', regex=True)
-    # Normalização básica de hora
-    df['Hora_tmp'] = df['Hora_tmp'].apply(lambda x: 
-        x if ':' in str(x) else ('VAZIO' if x in ['', 'nan', 'None'] else x))
-    temp_cols.append('Hora_tmp')
-    
-    # 4. Colunas opcionais
-    for col in ['Semana', 'Ano Comercial', 'Mês Comercial']:
-        if col in df.columns:
-            tmp_name = f"{col}_tmp"
-            df[tmp_name] = df[col].astype(str).str.strip().str.upper().replace(['', 'nan', 'None'], 'VAZIO')
-            temp_cols.append(tmp_name)
+        hashes = calcular_hash_linhas(df)
+        df[COLUNA_HASH_DEDUP] = hashes
 
-    # Remove duplicatas IN-PLACE
-    df.drop_duplicates(subset=temp_cols, keep='first', inplace=True)
-    
-    # Limpa temporárias
-    cols_to_remove = [c for c in temp_cols if c.endswith('_tmp')]
-    df.drop(columns=cols_to_remove, inplace=True)
+    duplicadas = pd.Series(hashes).duplicated(keep='first').to_numpy()
+    if duplicadas.any():
+        df = df[~duplicadas]
     
     duplicates_removed = original_count - len(df)
     return df, duplicates_removed
 
+def preparar_dados_fonte(df):
+    """
+    Etapas comuns a toda fonte do passo 1 (aba do upload, bloco de streaming ou planilha do Drive),
+    depois da limpeza e da seleção de colunas: tipos, Mês Comercial, Preço e duplicatas.
+    """
+    df = process_data_types(df)
+    df = calculate_mes_comercial(df)
+    if 'Preço' in df.columns:
+        df['Preço'] = clean_numeric_column(df['Preço']).fillna(0)
+    df, dup_removed = remove_duplicates_properly(df)
+    return df
+
+# Colunas de texto de baixa cardinalidade do compilado, guardadas como category
+# (o compilado fica em memória em app.df_compilado depois do job)
+COLUNAS_CATEGORICAS = ['Rádio', 'Cidade / UF', 'Peça', 'Comercial', 'Status', 'Semana', 'Ano Comercial', 'Mês Comercial']
+
+def _relatorio_memoria(df):
+    """Uso de memória (MB) por coluna, contando o conteúdo das strings"""
+    return df.memory_usage(deep=True, index=False) / (1024 * 1024)
+
+def compactar_dataframe(df):
+    """
+    Reduz a memória do compilado: colunas de COLUNAS_CATEGORICAS viram category (quando há
+    repetição suficiente) e colunas inteiras são reduzidas ao menor inteiro sem perda.
+    Métricas float (Preço, PMM, Universo, PMM no Target) continuam float64, mesmo com valores
+    inteiros, para as somas dos passos 2 e 3 terem o mesmo tipo e precisão de sempre.
+    Loga a memória por coluna antes/depois.
+    """
+    if df is None or df.empty:
+        return df
+    
+    antes = _relatorio_memoria(df)
+    
+    for col in COLUNAS_CATEGORICAS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            if df[col].nunique(dropna=True) <= len(df) // 2:
+                df[col] = df[col].astype('category')
+    
+    for col in df.columns:
+        if pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    
+    depois = _relatorio_memoria(df)
+    print(f"[MEMORIA] 📉 Compactação do compilado: {antes.sum():.1f}MB -> {depois.sum():.1f}MB")
+    for col in df.columns:
+        print(f"[MEMORIA]    {col}: {antes[col]:.2f}MB -> {depois[col]:.2f}MB ({df[col].dtype})")
+    return df
+
+# ==============================================================================
+# INGESTÃO EM BLOCOS (STREAMING) PARA UPLOADS MUITO GRANDES
+# ==============================================================================
+
+# Uploads a partir deste tamanho são lidos linha a linha (openpyxl read-only), só com as
+# colunas obrigatórias, em blocos de INGESTAO_BLOCO_LINHAS linhas. Assim o pico de memória
+# acompanha o tamanho do bloco e não o do workbook (evita OOM no Render com arquivos de 100-500MB).
+INGESTAO_STREAMING_MIN_BYTES = int(os.getenv('INGESTAO_STREAMING_MIN_MB', '50')) * 1024 * 1024
+INGESTAO_BLOCO_LINHAS = int(os.getenv('INGESTAO_BLOCO_LINHAS', '20000'))
+
+def usar_ingestao_streaming(xls, arquivo_path):
+    """Decide se a aba deve ser lida em blocos (só para .xlsx, lido via openpyxl)"""
+    try:
+        tamanho = os.path.getsize(arquivo_path)
+    except OSError:
+        return False
+    return xls.engine == 'openpyxl' and tamanho >= INGESTAO_STREAMING_MIN_BYTES
+
+def _linha_preenchida(linha):
+    """Mesmo critério de clean_dataframe: algum valor não nulo e que não seja string só com espaços"""
+    return any(v is not None and not (isinstance(v, str) and not v.strip()) for v in linha)
+
+def iterar_aba_em_blocos(xls, aba_nome, tamanho_bloco=None):
+    """
+    Gera DataFrames de até `tamanho_bloco` linhas (padrão: INGESTAO_BLOCO_LINHAS) de uma aba, já
+    projetados nas REQUIRED_COLUMNS. O cabeçalho é resolvido uma única vez (aceita 'ID' como
+    'Identificador'); a primeira linha de dados é descartada, como no modo normal (drop(index=0)).
+    Linhas vazias são descartadas olhando a linha inteira, antes da projeção, como o modo normal
+    faz (clean_dataframe antes de select_required_columns): uma linha preenchida só em colunas
+    não usadas é mantida nos dois modos.
+    """
+    tamanho_bloco = tamanho_bloco or INGESTAO_BLOCO_LINHAS
+    ws = xls.book[aba_nome]
+    linhas = ws.iter_rows(values_only=True)
+    
+    cabecalho = next(linhas, None)
+    if not cabecalho:
+        return
+    nomes = ['' if v is None else str(v) for v in cabecalho]
+    posicoes_por_nome = {}
+    for i, nome in enumerate(nomes):
+        posicoes_por_nome.setdefault(nome, i)
+    if 'Identificador' not in posicoes_por_nome and 'ID' in posicoes_por_nome:
+        posicoes_por_nome['Identificador'] = posicoes_por_nome['ID']
+    
+    colunas = [col for col in REQUIRED_COLUMNS if col in posicoes_por_nome]
+    if not colunas:
+        return
+    posicoes = [posicoes_por_nome[col] for col in colunas]
+    largura_minima = max(posicoes) + 1
+    
+    def projetar(linha):
+        if len(linha) < largura_minima:
+            linha = tuple(linha) + (None,) * (largura_minima - len(linha))
+        return [linha[i] for i in posicoes]
+    
+    # dtype=object: sem inferência por bloco, para que blocos diferentes tenham os mesmos tipos
+    primeira = next(linhas, None)
+    segunda = next(linhas, None)
+    if segunda is None:
+        if primeira is not None and _linha_preenchida(primeira):
+            yield pd.DataFrame([projetar(primeira)], columns=colunas, dtype=object)
+        return
+    
+    bloco = [projetar(segunda)] if _linha_preenchida(segunda) else []
+    for linha in linhas:
+        if not _linha_preenchida(linha):
+            continue
+        bloco.append(projetar(linha))
+        if len(bloco) >= tamanho_bloco:
+            yield pd.DataFrame(bloco, columns=colunas, dtype=object)
+            bloco = []
+    if bloco:
+        yield pd.DataFrame(bloco, columns=colunas, dtype=object)
+
+def ler_aba_em_blocos(xls, aba_nome):
+    """Lê uma aba em blocos passando cada um pela limpeza/tipagem/deduplicação; retorna o DataFrame da aba"""
+    blocos = []
+    total_lido = 0
+    for i, bloco in enumerate(iterar_aba_em_blocos(xls, aba_nome), 1):
+        total_lido += len(bloco)
+        bloco = clean_dataframe(bloco, remover_vazias=False)
+        if bloco.empty:
+            continue
+        blocos.append(preparar_dados_fonte(bloco))
+        mem = psutil.Process().memory_info().rss / (1024 * 1024)
+        print(f"[PASSO 1]       Bloco {i}: {total_lido} linhas lidas (Memoria: {mem:.1f}MB)")
+    
+    print(f"[PASSO 1]    Aba '{aba_nome}': {total_lido} registros lidos (streaming)")
+    if not blocos:
+        return pd.DataFrame()
+    
+    df_aba = pd.concat(blocos, ignore_index=True)
+    del blocos
+    # Duplicatas entre blocos diferentes
+    df_aba, dup_removed = remove_duplicates_properly(df_aba)
+    gc.collect()
+    return df_aba
+
 # ==============================================================================
 # PASSO 1: COMPILADOR
 # ==============================================================================
@@ -1261,11 +1806,14 @@ def passo1_compilar(arquivo_path):
     print(f"\n[PASSO 1] 🚀 Iniciando compilação...")
     print(f"[PASSO 1] 📄 Arquivo principal: {arquivo_path}")
     
+    xls = None
     try:
         all_dataframes = []
         
         # ========== ETAPA 1: Ler TODAS as abas do arquivo uploaded (não só a primeira) ==========
         print(f"[PASSO 1] 📖 ETAPA 1: Lendo arquivo principal (todas as abas de dados)")
+        # Sessão única do workbook para o job inteiro: o ZIP/XML é aberto e parseado uma vez
+        # e reaproveitado para as abas de dados e para a aba DadosIdentificador (ETAPA 4)
         xls = pd.ExcelFile(arquivo_path)
         sheet_names = xls.sheet_names
         # Pula abas que não são de relatório (DadosIdentificador, modelo, etc.)
@@ -1282,33 +1830,34 @@ def passo1_compilar(arquivo_path):
         if not abas_para_ler:
             abas_para_ler = [sheet_names[0]]
             print(f"[PASSO 1]    ℹ️ Usando apenas primeira aba: {abas_para_ler[0]}")
+        streaming = usar_ingestao_streaming(xls, arquivo_path)
+        if streaming:
+            print(f"[PASSO 1]    📦 Arquivo grande: ingestão em blocos de {INGESTAO_BLOCO_LINHAS} linhas (só colunas necessárias)")
         for aba_nome in abas_para_ler:
-            df_upload = pd.read_excel(arquivo_path, sheet_name=aba_nome)
-            print(f"[PASSO 1]    Aba '{aba_nome}': {len(df_upload)} registros lidos")
-            if len(df_upload) > 1:
-                df_upload = df_upload.drop(index=0).reset_index(drop=True)
-            df_upload = clean_dataframe(df_upload)
-            df_upload = select_required_columns(df_upload)
-            if df_upload.empty:
-                print(f"[PASSO 1]    ⚠️ Aba '{aba_nome}' sem colunas necessárias ou vazia após limpeza")
-                continue
-            df_upload = process_data_types(df_upload)
-            df_upload = calculate_mes_comercial(df_upload)
-            if 'Preço' in df_upload.columns:
-                df_upload['Preço'] = df_upload['Preço'].apply(clean_price_value)
-                df_upload['Preço'] = pd.to_numeric(df_upload['Preço'], errors='coerce')
-                df_upload['Preço'] = df_upload['Preço'].fillna(0)
-            df_upload, dup_removed = remove_duplicates_properly(df_upload)
+            if streaming:
+                df_upload = ler_aba_em_blocos(xls, aba_nome)
+                if df_upload.empty:
+                    print(f"[PASSO 1]    ⚠️ Aba '{aba_nome}' sem colunas necessárias ou vazia após limpeza")
+                    continue
+            else:
+                df_upload = xls.parse(aba_nome)
+                print(f"[PASSO 1]    Aba '{aba_nome}': {len(df_upload)} registros lidos")
+                if len(df_upload) > 1:
+                    df_upload = df_upload.drop(index=0).reset_index(drop=True)
+                df_upload = clean_dataframe(df_upload)
+                df_upload = select_required_columns(df_upload)
+                if df_upload.empty:
+                    print(f"[PASSO 1]    ⚠️ Aba '{aba_nome}' sem colunas necessárias ou vazia após limpeza")
+                    continue
+                df_upload = preparar_dados_fonte(df_upload)
             all_dataframes.append(df_upload)
             n_radios = df_upload['Rádio'].nunique() if 'Rádio' in df_upload.columns else 0
             print(f"[PASSO 1]    ✅ Aba '{aba_nome}': {len(df_upload)} registros, {n_radios} Rádio(s)")
-        xls.close()
         
         # ========== ETAPA 2: Ler OUTRAS PLANILHAS do Google Drive ==========
         print(f"\n[PASSO 1] 📖 ETAPA 2: Buscando outras planilhas no Google Drive...")
         
         drive_service = get_authenticated_drive_service()
-        sheets_service = get_authenticated_sheets_service()
         
         if not drive_service:
             print("[PASSO 1] ⚠️ Não autenticado no Google Drive - apenas arquivo local será processado")
@@ -1343,25 +1892,36 @@ def passo1_compilar(arquivo_path):
             
             print(f"\n[PASSO 1] 📊 Total de arquivos a processar: {len(report_sheets)}")
             
-            # Processa cada relatório do Drive
-            for i, sheet_info in enumerate(report_sheets, 1):
+            # Planilhas sem alteração no Drive (mesmo modifiedTime) vêm do cache em disco, já limpas
+            dfs_drive = {}
+            pendentes = []
+            for i, sheet_info in enumerate(report_sheets):
+                df_cache = cache_ingestao.carregar(sheet_info['id'], sheet_info.get('modifiedTime'))
+                if df_cache is not None:
+                    dfs_drive[i] = df_cache
+                else:
+                    # Planilha alterada (ou nova): a lista de abas/rowCount em cache não vale mais
+                    _esquecer_abas_planilha(sheet_info['id'])
+                    pendentes.append(i)
+            # Poda só com uma listagem válida: falha/pasta vazia (lista vazia) não pode apagar o cache
+            if report_sheets:
+                cache_ingestao.podar(info['id'] for info in report_sheets)
+            print(f"[PASSO 1] 💾 Cache: {len(dfs_drive)} planilha(s) sem alteração, {len(pendentes)} para ler do Drive")
+            
+            # Lê os relatórios alterados em paralelo (limitador de cota compartilhado) e limpa
+            # cada um assim que a leitura termina; a ordem original é mantida no concat
+            leituras = ler_planilhas_drive_concorrente([report_sheets[i] for i in pendentes])
+            for n, (j, sheet_info, df) in enumerate(leituras, 1):
+                i = pendentes[j]
                 sheet_name = sheet_info['name']
-                sheet_id = sheet_info['id']
                 
                 try:
-                    import psutil
                     mem = psutil.Process().memory_info().rss / (1024 * 1024)
-                    print(f"\n[PASSO 1] [{i}/{len(report_sheets)}] Analisando: {sheet_name} (Memoria: {mem:.1f}MB)")
+                    print(f"\n[PASSO 1] [{n}/{len(pendentes)}] Analisando: {sheet_name} (Memoria: {mem:.1f}MB)")
                     
                     # Calcula percentual progressivo (de 20% a 35%)
-                    perc = 20 + int((i / len(report_sheets)) * 15)
-                    atualizar_progresso(1, perc, f"Lendo do Drive: {sheet_name}")
-
-                    # Limite do Google: 60 leituras/minuto por usuário; pequena pausa evita HttpError 429
-                    if i > 1:
-                        time.sleep(1.2)
-                    # Lê o arquivo
-                    df = read_google_sheet(sheets_service, sheet_id, sheet_name)
+                    perc = 20 + int((n / len(pendentes)) * 15)
+                    atualizar_progresso(1, perc, f"Lido do Drive: {sheet_name}")
                     
                     if df is not None and not df.empty:
                         # Remove segunda linha se necessário
@@ -1375,22 +1935,11 @@ def passo1_compilar(arquivo_path):
                         df = select_required_columns(df)
                         
                         if not df.empty:
-                            # Processa tipos
-                            df = process_data_types(df)
-                            
-                            # Recalcula Mês Comercial (2026)
-                            df = calculate_mes_comercial(df)
-                            
-                            # Converte Preço
-                            if 'Preço' in df.columns:
-                                df['Preço'] = df['Preço'].apply(clean_price_value)
-                                df['Preço'] = pd.to_numeric(df['Preço'], errors='coerce')
-                                df['Preço'] = df['Preço'].fillna(0)
+                            # Tipos, Mês Comercial (2026), Preço e duplicatas
+                            df = preparar_dados_fonte(df)
                             
-                            # Remove duplicatas
-                            df, dup_removed = remove_duplicates_properly(df)
-                            
-                            all_dataframes.append(df)
+                            dfs_drive[i] = df
+                            cache_ingestao.salvar(sheet_info['id'], sheet_info.get('modifiedTime'), df)
                             print(f"[PASSO 1]       ✅ {len(df)} registros válidos adicionados")
                         else:
                             print(f"[PASSO 1]       ⚠️ Nenhum dado válido após limpeza")
@@ -1401,6 +1950,9 @@ def passo1_compilar(arquivo_path):
                     import traceback
                     traceback.print_exc()
                     continue
+            
+            all_dataframes.extend(dfs_drive[i] for i in sorted(dfs_drive))
+            del dfs_drive
         
         # ========== ETAPA 3: Unificar todos os dados ==========
         atualizar_progresso(1, 36, "Unificando arquivos do Drive...")
@@ -1435,45 +1987,25 @@ def passo1_compilar(arquivo_path):
         # Tenta Google Sheets primeiro, depois Excel
         df_dados_id = extract_dados_identificador_from_google_sheets()
         if df_dados_id is None:
-            df_dados_id = extract_dados_identificador(arquivo_path)
+            df_dados_id = extract_dados_identificador(xls)
         
         if df_dados_id is not None and 'Identificador' in unified_df.columns:
             print(f"[PASSO 1]    ✅ DadosIdentificador carregado: {len(df_dados_id)} registros")
             
-            unified_df['Identificador'] = unified_df['Identificador'].apply(_normalizar_identificador_para_merge)
-            df_dados_id['Identificador'] = df_dados_id['Identificador'].apply(_normalizar_identificador_para_merge)
-            df_dados_id = df_dados_id.drop_duplicates(subset=['Identificador'], keep='first').copy()
-            
-            unified_df = unified_df.merge(df_dados_id, on='Identificador', how='left')
+            # Join por códigos inteiros; porc/Universo já chegam numéricos (ponto = milhar, vírgula = decimal)
+            unified_df, linhas_sem, ids_sem = anexar_dados_identificador(unified_df, df_dados_id)
             print(f"[PASSO 1]    ✅ Merge realizado: {len(unified_df)} registros")
+            if linhas_sem:
+                print(f"[PASSO 1]    ℹ️ {ids_sem} Identificador(es) sem correspondência no DadosIdentificador ({linhas_sem} linhas, Universo=0)")
             
             # Libera DadosIdentificador após merge
             del df_dados_id
             gc.collect()
             
-            def clean_number_str(val):
-                if pd.isna(val): return val
-                if isinstance(val, (int, float)): return val
-                val = str(val).strip()
-                if val == '': return 0
-                val = val.replace('.', '').replace(',', '.')
-                return val
-
-            # Converte 'porc' para numérico se existir
-            if 'porc' in unified_df.columns:
-                unified_df['porc'] = unified_df['porc'].apply(clean_number_str)
-                unified_df['porc'] = pd.to_numeric(unified_df['porc'], errors='coerce')
-            
-            # Converte Universo para numérico
-            if 'Universo' in unified_df.columns:
-                unified_df['Universo'] = unified_df['Universo'].apply(clean_number_str)
-                unified_df['Universo'] = pd.to_numeric(unified_df['Universo'], errors='coerce')
-            
             # Calcula PMM no Target
             if 'PMM' in unified_df.columns and 'porc' in unified_df.columns:
                 # Garante que PMM também esteja limpo
-                unified_df['PMM'] = unified_df['PMM'].apply(clean_number_str)
-                unified_df['PMM'] = pd.to_numeric(unified_df['PMM'], errors='coerce').fillna(0)
+                unified_df['PMM'] = clean_numeric_column(unified_df['PMM'], ponto_milhar=True).fillna(0)
                 
                 unified_df['PMM no Target'] = (unified_df['PMM'] * (unified_df['porc'] / 100)).round(2)
                 unified_df['PMM no Target'] = unified_df['PMM no Target'].fillna(0)
@@ -1499,6 +2031,9 @@ def passo1_compilar(arquivo_path):
         # ========== ETAPA 5: Reorganizar e salvar ==========
         print(f"\n[PASSO 1] 📋 ETAPA 5: Reorganizando colunas...")
         
+        # O hash de deduplicação é interno (e o Identificador foi normalizado no merge)
+        unified_df = unified_df.drop(columns=[COLUNA_HASH_DEDUP], errors='ignore')
+        
         expected_columns = ['Identificador', 'Data', 'Hora', 'Rádio', 'Cidade / UF',
                            'Peça', 'Comercial', 'Status', 'PMM', 'Preço', 'Universo', 'PMM no Target']
         existing_cols = [col for col in expected_columns if col in unified_df.columns]
@@ -1506,6 +2041,9 @@ def passo1_compilar(arquivo_path):
         final_cols = existing_cols + other_cols
         unified_df = unified_df[final_cols]
         
+        # Texto repetido -> category, numéricos reduzidos sem perda
+        unified_df = compactar_dataframe(unified_df)
+        
         print(f"[PASSO 1] ✅ Compilação concluída: {len(unified_df)} registros finais")
         print(f"[PASSO 1] 📊 Colunas: {list(unified_df.columns)}")
         
@@ -1531,6 +2069,9 @@ def passo1_compilar(arquivo_path):
         import traceback
         traceback.print_exc()
         return None, f"Erro na compilação: {str(e)}", None
+    finally:
+        if xls is not None:
+            xls.close()
 
 # ==============================================================================
 # PASSO 2: RELATÓRIO MENSAL (Com busca de modelo Google Sheets)
@@ -1555,46 +2096,38 @@ def setup_google_services():
         )
         
         gc = gspread.authorize(creds)
-        drive_service = build('drive', 'v3', credentials=creds)
+        drive_service = construir_cliente('drive', 'v3', creds)
         print("[GOOGLE] ✅ Autenticação configurada com scopes corretos")
         return gc, drive_service
     except Exception as e:
         print(f"[GOOGLE] ⚠️ Erro na autenticação: {str(e)}")
         return None, None
 
+def _buscar_modelo_relatorio(drive_service):
+    """ID do modelo VeriModeloRelatorio no índice local de RelatorioVeri (None se não houver)"""
+    if not resolvedor_drive.sincronizar(drive_service):
+        print("[PASSO 2] ⚠️ Pasta 'RelatorioVeri' não encontrada no Google Drive")
+        return None
+    
+    modelo_patterns = ['VeriModeloRelatorio', 'Veri Modelo Relatorio', 'Modelo Relatorio', 'Modelo']
+    
+    for pattern in modelo_patterns:
+        modelo_info = indice_relatorioveri.buscar(contem=pattern, mime_type=MIME_PLANILHA)
+        if modelo_info:
+            print(f"[PASSO 2] ✅ Modelo encontrado: {modelo_info['name']}")
+            return modelo_info['id']
+    
+    print("[PASSO 2] ⚠️ Modelo não encontrado no Google Drive")
+    return None
+
 def find_modelo_relatorio(drive_service):
-    """Encontra o arquivo VeriModeloRelatorio no Google Drive"""
+    """Encontra o arquivo VeriModeloRelatorio no Google Drive (ID reaproveitado dentro do TTL)"""
     if not drive_service:
         print("[PASSO 2] ⚠️ Google Drive não disponível")
         return None
     
     try:
-        # Busca a pasta RelatorioVeri
-        folder_query = "name='RelatorioVeri' and mimeType='application/vnd.google-apps.folder'"
-        folder_results = drive_service.files().list(q=folder_query, fields="files(id, name)").execute()
-        folders = folder_results.get('files', [])
-        
-        if not folders:
-            print("[PASSO 2] ⚠️ Pasta 'RelatorioVeri' não encontrada no Google Drive")
-            return None
-        
-        folder_id = folders[0]['id']
-        
-        # Busca o modelo VeriModeloRelatorio
-        modelo_patterns = ['VeriModeloRelatorio', 'Veri Modelo Relatorio', 'Modelo Relatorio', 'Modelo']
-        
-        for pattern in modelo_patterns:
-            modelo_query = f"'{folder_id}' in parents and name contains '{pattern}' and mimeType='application/vnd.google-apps.spreadsheet'"
-            modelo_results = drive_service.files().list(q=modelo_query, fields="files(id, name)").execute()
-            modelos = modelo_results.get('files', [])
-            
-            if modelos:
-                modelo_info = modelos[0]
-                print(f"[PASSO 2] ✅ Modelo encontrado: {modelo_info['name']}")
-                return modelo_info['id']
-        
-        print("[PASSO 2] ⚠️ Modelo não encontrado no Google Drive")
-        return None
+        return resolvedor_drive.resolver('modelo', lambda: _buscar_modelo_relatorio(drive_service))
     
     except Exception as e:
         print(f"[PASSO 2] ⚠️ Erro ao buscar modelo: {str(e)}")
@@ -1610,12 +2143,10 @@ def export_modelo_as_excel(modelo_id, drive_service):
             return None
         
         # Faz download do arquivo Excel do Google Sheets via API
-        request = drive_service.files().export(
+        file_content = executar_com_cota(drive_service.files().export(
             fileId=modelo_id,
             mimeType='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        
-        file_content = request.execute()
+        ), limitador=None, descricao='modelo')
         
         if not file_content or len(file_content) == 0:
             print("[PASSO 2] ❌ Arquivo vazio baixado")
@@ -1626,15 +2157,8 @@ def export_modelo_as_excel(modelo_id, drive_service):
         temp_file.write(file_content)
         temp_file.close()
         
+        # A validação do Excel fica para fill_modelo_with_data, que já abre o arquivo
         print(f"[PASSO 2] ✅ Modelo exportado: {temp_file.name} ({len(file_content)} bytes)")
-        
-        # Valida se é um arquivo Excel válido
-        try:
-            test_wb = load_workbook(temp_file.name)
-            print(f"[PASSO 2] ✅ Excel válido: {test_wb.sheetnames}")
-        except Exception as e:
-            print(f"[PASSO 2] ⚠️ Arquivo pode ser inválido: {str(e)}")
-        
         return temp_file.name
     
     except Exception as e:
@@ -1643,9 +2167,44 @@ def export_modelo_as_excel(modelo_id, drive_service):
         traceback.print_exc()
         return None
 
+# Métricas do agregado mensal copiadas para o modelo (mesmo nome no DataFrame do modelo)
+METRICAS_MODELO = ['Impacto', 'TRPs', 'Investimento', 'PMM', 'Universo']
+
+def indexar_agregado_mensal(aggregated_data):
+    """
+    Índice do agregado mensal para o preenchimento do modelo, montado uma vez:
+    {(praça, período): métricas} para a busca exata e, por praça, [(período, métricas)] na ordem
+    do agregado para o fallback por substring (Mês do modelo contendo o período, ex: "Jan'26 ...").
+    Aceita as colunas Praça/Mês (saída do passo 2) ou Praca_Mapeada/Periodo_Comercial.
+    """
+    col_praca = 'Praca_Mapeada' if 'Praca_Mapeada' in aggregated_data.columns else 'Praça'
+    col_periodo = 'Periodo_Comercial' if 'Periodo_Comercial' in aggregated_data.columns else 'Mês'
+    metricas = [m for m in METRICAS_MODELO if m in aggregated_data.columns]
+    valores = {m: aggregated_data[m].to_numpy() for m in metricas}
+    
+    exato = {}
+    por_praca = {}
+    pracas = aggregated_data[col_praca].astype(str).str.strip()
+    periodos = aggregated_data[col_periodo].astype(str).str.strip()
+    for i, (praca, periodo) in enumerate(zip(pracas, periodos)):
+        linha = {m: valores[m][i] for m in metricas}
+        exato.setdefault((praca, periodo), linha)
+        por_praca.setdefault(praca, []).append((periodo, linha))
+    return exato, por_praca
+
+def buscar_agregado_mensal(indice, praca, mes):
+    """Métricas da praça/mês do modelo: chave exata; senão o primeiro período da praça contido no Mês"""
+    exato, por_praca = indice
+    linha = exato.get((praca, mes))
+    if linha is None:
+        linha = next((l for periodo, l in por_praca.get(praca, ()) if periodo in mes), None)
+    return linha
+
 def fill_modelo_with_data(modelo_file, aggregated_data):
     """
-    Carrega o modelo Excel, preenche com dados agregados, preservando formatação
+    Carrega o modelo Excel, preenche com dados agregados, preservando formatação.
+    Cada linha do modelo é resolvida no índice do agregado (sem varrer o agregado por linha)
+    e as escritas são feitas coluna a coluna.
     """
     try:
         print(f"[PASSO 2] 📋 Carregando modelo de {modelo_file}...")
@@ -1662,8 +2221,7 @@ def fill_modelo_with_data(modelo_file, aggregated_data):
         
         # Encontra os headers na primeira linha
         headers = {}
-        for col_idx in range(1, ws.max_column + 1):
-            cell_value = ws.cell(1, col_idx).value
+        for col_idx, cell_value in enumerate(next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ()), start=1):
             if cell_value:
                 headers[str(cell_value).strip()] = col_idx
         
@@ -1672,11 +2230,7 @@ def fill_modelo_with_data(modelo_file, aggregated_data):
         # Mapeia nomes de colunas - tenta várias variações
         col_praca = None
         col_mes = None
-        col_impacto = None
-        col_trp = None
-        col_investimento = None
-        col_pmm = None
-        col_universo = None
+        colunas_metricas = {}
         
         # Busca Praça
         for key in headers:
@@ -1693,82 +2247,61 @@ def fill_modelo_with_data(modelo_file, aggregated_data):
         # Busca colunas de dados
         for key in headers:
             if 'impacto' in key.lower():
-                col_impacto = headers[key]
+                colunas_metricas['Impacto'] = headers[key]
             elif 'trp' in key.lower():
-                col_trp = headers[key]
+                colunas_metricas['TRPs'] = headers[key]
             elif 'investimento' in key.lower():
-                col_investimento = headers[key]
+                colunas_metricas['Investimento'] = headers[key]
             elif 'pmm' in key.lower() and 'no target' not in key.lower():
-                col_pmm = headers[key]
+                colunas_metricas['PMM'] = headers[key]
             elif 'universo' in key.lower():
-                col_universo = headers[key]
+                colunas_metricas['Universo'] = headers[key]
         
         print(f"[PASSO 2] 🔍 Mapeamento de colunas:")
         print(f"   - Praça: {col_praca}")
         print(f"   - Mês/Período: {col_mes}")
-        print(f"   - Impacto: {col_impacto}")
-        print(f"   - TRPs: {col_trp}")
-        print(f"   - Investimento: {col_investimento}")
-        print(f"   - PMM: {col_pmm}")
-        print(f"   - Universo: {col_universo}")
+        for metrica in METRICAS_MODELO:
+            print(f"   - {metrica}: {colunas_metricas.get(metrica)}")
         
         if not col_praca or not col_mes:
             print(f"[PASSO 2] ⚠️ Colunas essenciais (Praça/Mês) não encontradas!")
             print(f"[PASSO 2] Headers disponíveis: {list(headers.keys())}")
             return None
         
-        updates_made = 0
+        indice = indexar_agregado_mensal(aggregated_data)
+        metricas = [m for m in METRICAS_MODELO if m in colunas_metricas and m in aggregated_data.columns]
         
-        # Itera linhas do modelo (a partir da linha 2, pulando header)
+        # Lê Praça e Mês de todas as linhas do modelo (a partir da linha 2, pulando header)
         print(f"[PASSO 2] 📊 Preenchendo modelo, total de {ws.max_row - 1} linhas...")
-        
-        for row_idx in range(2, ws.max_row + 1):
-            praca_cell = ws.cell(row=row_idx, column=col_praca)
-            mes_cell = ws.cell(row=row_idx, column=col_mes)
-            
-            if not praca_cell.value or not mes_cell.value:
+        primeira, ultima = sorted((col_praca, col_mes))
+        escritas = {m: [] for m in metricas}
+        for row_idx, linha_modelo in enumerate(
+            ws.iter_rows(min_row=2, min_col=primeira, max_col=ultima, values_only=True), start=2
+        ):
+            praca_value = linha_modelo[col_praca - primeira]
+            mes_value = linha_modelo[col_mes - primeira]
+            if not praca_value or not mes_value:
                 continue
             
-            praca_value = str(praca_cell.value).strip()
-            mes_value = str(mes_cell.value).strip()
-            
-            # Busca dados correspondentes no aggregated_data
-            found = False
-            for _, data_row in aggregated_data.iterrows():
-                praca_match = str(data_row['Praca_Mapeada']).strip() == praca_value
-                mes_match = mes_value and str(data_row['Periodo_Comercial']).strip() in mes_value
-                
-                if praca_match and mes_match:
-                    found = True
-                    # Preenche as células com dados, preservando formatação
-                    if col_impacto and 'Impacto' in data_row.index:
-                        val = round(float(data_row['Impacto']), 2) if data_row['Impacto'] else 0
-                        ws.cell(row=row_idx, column=col_impacto).value = val
-                        updates_made += 1
-                    
-                    if col_trp and 'TRPs' in data_row.index:
-                        val = round(float(data_row['TRPs']), 2) if data_row['TRPs'] else 0
-                        ws.cell(row=row_idx, column=col_trp).value = val
-                        updates_made += 1
-                    
-                    if col_investimento and 'Investimento' in data_row.index:
-                        val = round(float(data_row['Investimento']), 2) if data_row['Investimento'] else 0
-                        ws.cell(row=row_idx, column=col_investimento).value = val
-                        updates_made += 1
-                    
-                    if col_pmm and 'PMM' in data_row.index:
-                        val = round(float(data_row['PMM']), 2) if data_row['PMM'] else 0
-                        ws.cell(row=row_idx, column=col_pmm).value = val
-                        updates_made += 1
-                    
-                    if col_universo and 'Universo' in data_row.index:
-                        val = round(float(data_row['Universo']), 2) if data_row['Universo'] else 0
-                        ws.cell(row=row_idx, column=col_universo).value = val
-                        updates_made += 1
-                    
-                    break
+            dados = buscar_agregado_mensal(indice, str(praca_value).strip(), str(mes_value).strip())
+            if dados is None:
+                continue
+            for metrica in metricas:
+                valor = dados[metrica]
+                escritas[metrica].append((row_idx, round(float(valor), 2) if valor else 0))
+        
+        # Escritas agrupadas por coluna, preservando a formatação das células do modelo
+        updates_made = 0
+        for metrica, valores in escritas.items():
+            coluna = colunas_metricas[metrica]
+            for row_idx, valor in valores:
+                ws.cell(row=row_idx, column=coluna).value = valor
+            updates_made += len(valores)
         
         print(f"[PASSO 2] ✅ Preenchimento concluído: {updates_made} células atualizadas")
+        if not updates_made:
+            print("[PASSO 2] ⚠️ Nenhuma praça/mês do modelo corresponde ao agregado")
+            return None
         
         # Salva o workbook modificado em bytes
         output = io.BytesIO()
@@ -1783,6 +2316,31 @@ def fill_modelo_with_data(modelo_file, aggregated_data):
         traceback.print_exc()
         return None
 
+def gerar_relatorio_com_modelo(aggregated_data):
+    """
+    Relatório mensal no formato do VeriModeloRelatorio: encontra o modelo no Drive, exporta como
+    Excel e preenche com o agregado. Retorna BytesIO do .xlsx ou None (sem Drive/modelo ou falha).
+    """
+    drive_service = get_authenticated_drive_service()
+    if not drive_service:
+        print("[PASSO 2] ℹ️ Não autenticado no Google Drive - relatório mensal sem modelo")
+        return None
+    
+    modelo_id = find_modelo_relatorio(drive_service)
+    if not modelo_id:
+        return None
+    
+    modelo_file = export_modelo_as_excel(modelo_id, drive_service)
+    if not modelo_file:
+        return None
+    try:
+        return fill_modelo_with_data(modelo_file, aggregated_data)
+    finally:
+        try:
+            os.remove(modelo_file)
+        except OSError:
+            pass
+
 
 def read_modelo_relatorio(gc, sheet_id):
     """Lê a estrutura do modelo de relatório do Google Sheets"""
@@ -1805,41 +2363,30 @@ def read_modelo_relatorio(gc, sheet_id):
         return None
 
 def create_filled_report(df_modelo, aggregated_data):
-    """Cria uma cópia do modelo preenchida com os dados agregados"""
+    """Cria uma cópia do modelo preenchida com os dados agregados (busca no índice, escrita por coluna)"""
     try:
         df_report = df_modelo.copy()
         updates_made = 0
         
         print("[PASSO 2] 📊 Preenchendo modelo com dados...")
         
-        # Tenta preencher o modelo com os dados agregados
-        for index, row in df_report.iterrows():
-            praca = row.get('Praça', '')
-            mes_col = row.get('Mês', '')
-            
-            if not praca or not mes_col:
-                continue
-            
-            # Busca dados para esta praça e período
-            for _, data_row in aggregated_data.iterrows():
-                if data_row['Praca_Mapeada'] == praca and data_row['Periodo_Comercial'] in str(mes_col):
-                    # Preenche as métricas
-                    if 'Impacto' in data_row.index:
-                        df_report.at[index, 'Impacto'] = round(data_row['Impacto'], 2)
-                        updates_made += 1
-                    if 'TRPs' in data_row.index:
-                        df_report.at[index, 'TRPs'] = round(data_row['TRPs'], 2)
-                        updates_made += 1
-                    if 'Investimento' in data_row.index:
-                        df_report.at[index, 'Investimento'] = round(data_row['Investimento'], 2)
-                        updates_made += 1
-                    if 'PMM' in data_row.index:
-                        df_report.at[index, 'PMM'] = round(data_row['PMM'], 2)
-                        updates_made += 1
-                    if 'Universo' in data_row.index:
-                        df_report.at[index, 'Universo'] = round(data_row['Universo'], 2)
-                        updates_made += 1
-                    break
+        if 'Praça' not in df_report.columns or 'Mês' not in df_report.columns:
+            print("[PASSO 2] ⚠️ Modelo sem colunas Praça/Mês")
+            return df_report
+        
+        # Resolve cada linha do modelo no índice do agregado
+        indice = indexar_agregado_mensal(aggregated_data)
+        dados_por_linha = [
+            buscar_agregado_mensal(indice, str(praca).strip(), str(mes).strip()) if praca and mes else None
+            for praca, mes in zip(df_report['Praça'].fillna(''), df_report['Mês'].fillna(''))
+        ]
+        encontradas = np.array([dados is not None for dados in dados_por_linha], dtype=bool)
+        
+        if encontradas.any():
+            linhas = [dados for dados in dados_por_linha if dados is not None]
+            for metrica in [m for m in METRICAS_MODELO if m in aggregated_data.columns]:
+                df_report.loc[encontradas, metrica] = np.round([dados[metrica] for dados in linhas], 2)
+                updates_made += len(linhas)
         
         print(f"[PASSO 2] ✅ Preenchimento concluído: {updates_made} células atualizadas")
         return df_report
@@ -1848,35 +2395,27 @@ def create_filled_report(df_modelo, aggregated_data):
         print(f"[PASSO 2] ⚠️ Erro ao preencher modelo: {str(e)}")
         return None
 
-def get_periodo_comercial_for_date(data):
-    """Determina o período comercial para uma data"""
-    if pd.isna(data):
-        return None
-
-    try:
-        data_date = pd.to_datetime(data, format='%d/%m/%Y').date()
-    except:
-        return None
-
-    for periodo, (inicio, fim) in PERIODOS_COMERCIAIS.items():
-        inicio_dt = datetime.strptime(inicio, '%Y-%m-%d').date()
-        fim_dt = datetime.strptime(fim, '%Y-%m-%d').date()
-
-        if inicio_dt <= data_date <= fim_dt:
-            return periodo
-
-    return None
-
 def map_cidade_to_praca(cidade):
-    """Mapeia cidade para praça"""
+    """Mapeia cidade para praça (tolerante a acentos, caixa e espaços)"""
     if pd.isna(cidade):
         return None
     
-    for praca, cidades in MAPA_PRACAS.items():
-        if cidade in cidades:
-            return praca
+    posicao = _INDICE_PRACAS.get(_normalizar_cidade(cidade))
+    return PRACAS[posicao] if posicao is not None else None
 
-    return None
+def mapear_pracas(cidades):
+    """
+    Mapeia a coluna 'Cidade / UF' inteira para praças: fatoriza os valores, normaliza/busca só os
+    valores únicos no índice e aplica o resultado com um único take. Retorna Series categórica
+    (NaN onde a cidade não pertence a nenhuma praça).
+    """
+    codigos, unicos = pd.factorize(cidades)
+    # Última posição = -1 para os nulos (código -1 do factorize)
+    praca_por_unico = np.array([_INDICE_PRACAS.get(_normalizar_cidade(c), -1) for c in unicos] + [-1])
+    return pd.Series(
+        pd.Categorical.from_codes(praca_por_unico[codigos], categories=PRACAS),
+        index=cidades.index
+    )
 
 def passo2_mensal(df_compilado=None):
     """Passo 2: Gera relatório mensal como CÓPIA DO MODELO preenchida com dados"""
@@ -1898,82 +2437,53 @@ def passo2_mensal(df_compilado=None):
         if df_compilado.empty:
             return None, "Dados compilados vazios"
         
-        df = df_compilado.copy()
-        
-        # Converte Data para datetime
-        df['Data'] = pd.to_datetime(df['Data'], format='%d/%m/%Y', errors='coerce')
-        
-        df_clean = df.dropna(subset=['Data']).copy()
-        
-        # Mapeia períodos
-        df_clean['Periodo_Comercial'] = df_clean['Data'].apply(lambda x: get_periodo_comercial_for_date(x))
+        # Chaves do relatório direto das colunas do compilado, sem copiar o DataFrame:
+        # período comercial pela Data (já tipada no passo 1; texto só no compilado lido do disco)
+        # e praça pela Cidade / UF
+        periodos = CALENDARIO_PERIODOS.rotular(parse_data_column(df_compilado['Data']))
+        pracas = mapear_pracas(df_compilado['Cidade / UF'])
+        validos = (periodos.notna() & pracas.notna()).to_numpy()
         
-        # Mapeia praças
-        df_clean['Praca_Mapeada'] = df_clean['Cidade / UF'].apply(map_cidade_to_praca)
-        
-        # Filtra válidos
-        df_valid = df_clean[(df_clean['Periodo_Comercial'].notna()) & (df_clean['Praca_Mapeada'].notna())].copy()
-        
-        if df_valid.empty:
+        if not validos.any():
             return None, "Nenhum dado válido após mapeamento"
         
-        # Converte colunas numéricas ANTES de agregar
-        numeric_cols = ['PMM', 'PMM no Target', 'Universo']
-        for col in numeric_cols:
-            if col in df_valid.columns:
-                df_valid[col] = pd.to_numeric(df_valid[col], errors='coerce')
-                df_valid[col] = df_valid[col].fillna(0)
-        
-        # Limpa Preço (de "R$ 147,03" para numérico)
-        if 'Preço' in df_valid.columns:
-            df_valid['Preço'] = df_valid['Preço'].apply(clean_price_value)
-            df_valid['Preço'] = pd.to_numeric(df_valid['Preço'], errors='coerce')
-            df_valid['Preço'] = df_valid['Preço'].fillna(0)
-        
-        print(f"[PASSO 2] Dados preparados: PMM no Target sum={df_valid['PMM no Target'].sum()}")
-        
-        # PARTE 1: Agrupa por Identificador para pegar valores únicos
-        df_unique = df_valid.groupby(['Periodo_Comercial', 'Praca_Mapeada', 'Identificador']).agg({
-            'PMM': 'first',
-            'Universo': 'first'
-        }).reset_index()
-        
-        # PARTE 2: Agrega valores únicos por período e praça
-        aggregated_unique = df_unique.groupby(['Periodo_Comercial', 'Praca_Mapeada']).agg({
-            'PMM': 'sum',
-            'Universo': 'sum'
-        }).reset_index()
-        
-        # PARTE 3: Agrega TODOS os valores (com duplicatas)
-        aggregated_all = df_valid.groupby(['Periodo_Comercial', 'Praca_Mapeada']).agg({
-            'PMM': 'sum',           # Impacto
-            'PMM no Target': 'sum', # TRPs
-            'Preço': 'sum'          # Investimento
-        }).reset_index()
-        
-        # Renomeia
-        aggregated_all = aggregated_all.rename(columns={
-            'PMM': 'Impacto',
-            'PMM no Target': 'TRPs',
-            'Preço': 'Investimento'
-        })
-        
-        aggregated_unique = aggregated_unique.rename(columns={
-            'PMM': 'PMM_UniqueSum',
-            'Universo': 'Universo_UniqueSum'
+        # Só as colunas da agregação, das linhas válidas, já numéricas (Preço de "R$ 147,03" para número)
+        base = pd.DataFrame({
+            'Periodo_Comercial': periodos[validos],
+            'Praca_Mapeada': pracas[validos],
+            'Identificador': df_compilado['Identificador'][validos],
+            'PMM': pd.to_numeric(df_compilado['PMM'][validos], errors='coerce').fillna(0),
+            'PMM no Target': pd.to_numeric(df_compilado['PMM no Target'][validos], errors='coerce').fillna(0),
+            'Preço': clean_numeric_column(df_compilado['Preço'][validos]).fillna(0),
+            'Universo': pd.to_numeric(df_compilado['Universo'][validos], errors='coerce').fillna(0),
         })
         
-        # Junta os DataFrames
-        result = aggregated_all.merge(
-            aggregated_unique,
-            on=['Periodo_Comercial', 'Praca_Mapeada'],
-            how='left'
-        )
+        print(f"[PASSO 2] Dados preparados: PMM no Target sum={base['PMM no Target'].sum()}")
+        
+        # PMM e Universo entram uma vez por Identificador em cada período/praça: a primeira linha de
+        # cada (período, praça, Identificador), achada por hash; as repetidas contribuem com 0
+        chaves = ['Periodo_Comercial', 'Praca_Mapeada']
+        primeira = ~base.duplicated(chaves + ['Identificador']) & base['Identificador'].notna()
+        base['PMM_Unico'] = base['PMM'].where(primeira, 0)
+        base['Universo_Unico'] = base['Universo'].where(primeira, 0)
+        
+        # Uma única agregação: totais com duplicatas (Impacto, TRPs, Investimento) e somas únicas
+        result = base.groupby(chaves, observed=True).agg(
+            Impacto=('PMM', 'sum'),
+            TRPs=('PMM no Target', 'sum'),
+            Investimento=('Preço', 'sum'),
+            Universo=('Universo_Unico', 'sum'),
+            PMM=('PMM_Unico', 'sum'),
+            Identificadores=('Identificador', 'count'),
+        ).reset_index()
+        del base
+        
+        # Período/praça sem nenhum Identificador preenchido não tem PMM/Universo únicos
+        sem_identificador = result.pop('Identificadores').eq(0)
+        if sem_identificador.any():
+            result.loc[sem_identificador, ['Universo', 'PMM']] = np.nan
         
-        # Renomeia colunas finais
         result = result.rename(columns={
-            'PMM_UniqueSum': 'PMM',
-            'Universo_UniqueSum': 'Universo',
             'Praca_Mapeada': 'Praça',
             'Periodo_Comercial': 'Mês'
         })
@@ -1984,24 +2494,23 @@ def passo2_mensal(df_compilado=None):
         print(f"[PASSO 2] Relatório agregado gerado: {len(result)} linhas")
         
         # ============================================================
-        # MODELO DO GOOGLE SHEETS - DESATIVADO TEMPORARIAMENTE
+        # MODELO DO GOOGLE SHEETS (VeriModeloRelatorio)
         # ============================================================
-        # TODO: Reimplementar exportação e preenchimento do modelo
-        excel_output = None
+        excel_output = gerar_relatorio_com_modelo(result)
         
         # Se conseguiu preencher o modelo, usa ele; senão usa o agregado simples
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"RELATORIO_MENSAL_{timestamp}.xlsx"
         
         if excel_output:
-            # Salva o output do openpyxl
-            saidas_path = os.path.join('flask_app', 'saidas', filename)
+            # Salva o output do openpyxl na mesma pasta dos outros relatórios (upload automático)
+            saidas_path = os.path.join(app.config['SAIDAS_FOLDER'], filename)
             os.makedirs(os.path.dirname(saidas_path), exist_ok=True)
             
             with open(saidas_path, 'wb') as f:
                 f.write(excel_output.getvalue())
             
-            print(f"[SAIDAS] ✅ Arquivo salvo localmente: {filename}")
+            print(f"[SAIDAS] ✅ Relatório mensal (modelo preenchido) salvo: {filename}")
         else:
             # Fallback: salva o agregado simples COM FORMATAÇÃO MENSAL
             save_to_saidas(result, filename, apply_formatting=True)
@@ -2014,67 +2523,6 @@ def passo2_mensal(df_compilado=None):
         traceback.print_exc()
         return None, f"Erro no passo 2: {str(e)}"
 
-# ==============================================================================
-# FUNÇÕES AUXILIARES: Extração de Ano e Mês Comercial
-# ==============================================================================
-
-def extrair_ano_comercial(periodo_semana_str):
-    """
-    Extrai o ano comercial da string da semana
-    Formato: "Semana 01: 29/12/2025 a 04/01/2026"
-    Retorna o ano da segunda data (fim do período) como número inteiro
-    """
-    try:
-        # Tenta encontrar a segunda data (após " a " ou após "-")
-        if ' a ' in periodo_semana_str:
-            data_fim_str = periodo_semana_str.split(' a ')[1].strip()
-        elif '-' in periodo_semana_str:
-            data_fim_str = periodo_semana_str.split('-')[1].strip()
-        else:
-            return ''
-        
-        # Extrai o ano (últimos 4 caracteres) como número inteiro
-        ano = data_fim_str.split('/')[-1]
-        return ano  # Ex: 2026 (sem apóstrofo)
-    except:
-        return ''
-
-def extrair_mes_comercial(periodo_semana_str):
-    """
-    Extrai o mês comercial da string da semana
-    Formato: "Semana 01: 29/12/2025 a 04/01/2026"
-    Determina o mês comercial baseado no período
-    Retorna formato: "Jan'26", "Fev'26", etc
-    """
-    try:
-        # Encontra a segunda data (período final)
-        if ' a ' in periodo_semana_str:
-            data_fim_str = periodo_semana_str.split(' a ')[1].strip()
-        elif '-' in periodo_semana_str:
-            data_fim_str = periodo_semana_str.split('-')[1].strip()
-        else:
-            return ''
-        
-        # Parse da data final (DD/MM/YYYY)
-        partes = data_fim_str.split('/')
-        if len(partes) == 3:
-            dia = int(partes[0])
-            mes = int(partes[1])
-            ano = partes[2]
-            
-            # Nomes dos meses abreviados em português
-            meses = {
-                1: 'Jan', 2: 'Fev', 3: 'Mar', 4: 'Abr',
-                5: 'Mai', 6: 'Jun', 7: 'Jul', 8: 'Ago',
-                9: 'Set', 10: 'Out', 11: 'Nov', 12: 'Dez'
-            }
-            
-            mes_nome = meses.get(mes, '')
-            return f"{mes_nome}'{ano[-2:]}"  # Ex: "Jan'26"
-        return ''
-    except:
-        return ''
-
 # ==============================================================================
 # PASSO 3: RELATÓRIO SEMANAL
 # ==============================================================================
@@ -2105,8 +2553,8 @@ def passo3_semanal(df_compilado=None):
         
         df = df_compilado.copy()
         
-        # Converte Data
-        df['Data'] = pd.to_datetime(df['Data'], format='%d/%m/%Y', errors='coerce')
+        # Data em datetime (já vem tipada do passo 1; só o compilado lido do disco é texto)
+        df['Data'] = parse_data_column(df['Data'])
         df = df.dropna(subset=['Data'])
         
         # Calcula semana
@@ -2128,14 +2576,12 @@ def passo3_semanal(df_compilado=None):
         
         # Limpa Preço (de "R$ 147,03" para numérico)
         if 'Preço' in df.columns:
-            df['Preço'] = df['Preço'].apply(clean_price_value)
-            df['Preço'] = pd.to_numeric(df['Preço'], errors='coerce')
-            df['Preço'] = df['Preço'].fillna(0)
+            df['Preço'] = clean_numeric_column(df['Preço']).fillna(0)
         
         print(f"[PASSO 3] Dados preparados: PMM no Target sum={df['PMM no Target'].sum()}")
         
         # Agrupa por Rádio e Periodo_Semana
-        grouped = df.groupby(['Rádio', 'Periodo_Semana']).agg({
+        grouped = df.groupby(['Rádio', 'Periodo_Semana'], observed=True).agg({
             'Identificador': 'count',        # Contagem de inserções
             'Preço': 'sum',                  # Investimento
             'PMM': 'sum',                    # Soma de todos os PMM (Impactos)
@@ -2144,7 +2590,7 @@ def passo3_semanal(df_compilado=None):
         }).reset_index()
         
         # Calcula PMM único por identificador
-        pmm_unique = df.groupby(['Rádio', 'Periodo_Semana']).apply(
+        pmm_unique = df.groupby(['Rádio', 'Periodo_Semana'], observed=True).apply(
             lambda x: x.drop_duplicates('Identificador')['PMM'].sum()
         ).reset_index(name='PMM_Unico')
         
@@ -2161,9 +2607,10 @@ def passo3_semanal(df_compilado=None):
             'PMM_Unico': 'PMM'
         })
         
-        # Extrai Ano Comercial e Mês Comercial da coluna Semana
-        result_df['Ano Comercial'] = result_df['Semana'].apply(extrair_ano_comercial)
-        result_df['Mês Comercial'] = result_df['Semana'].apply(extrair_mes_comercial)
+        # Ano Comercial e Mês Comercial a partir do fim de cada semana (já em datetime, sem reparsear a string)
+        fim_da_semana = result_df['Semana'].map(df.drop_duplicates('Periodo_Semana').set_index('Periodo_Semana')['Week_End'])
+        result_df['Ano Comercial'] = rotular_ano(fim_da_semana)
+        result_df['Mês Comercial'] = rotular_mes_abreviado(fim_da_semana)
         
         # Adiciona coluna Programado (vazia)
         result_df['Programado'] = ''
@@ -2220,7 +2667,7 @@ def atualizar_semanal_oficial(df_semanal_novo):
             df_semanal_novo['Semana'] = df_semanal_novo['Semana'].astype(str).str.replace(r'\s+a\s+', '-', regex=True)
         
         # ID do arquivo oficial no Google Drive
-        file_id_oficial = "1o5RJnLMpMHMtvyG7FscwFhz37sxcc0_T"
+        file_id_oficial = resolvedor_drive.resolver('semanal_oficial')
         
         print(f"[SEMANAL OFICIAL] 🚀 Iniciando atualização (DataFrame com {len(df_semanal_novo)} linhas)")
         print(f"[SEMANAL OFICIAL] Colunas disponíveis: {list(df_semanal_novo.columns)}")
@@ -2697,7 +3144,7 @@ def download(tipo):
         if df is not None:
             output = io.BytesIO()
             with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False)
+                formatar_para_exportacao(df).to_excel(writer, index=False)
             output.seek(0)
             
             filename = f"RELATORIO_{tipo.upper()}_{datetime.now().strftime('%Y%m%d')}.xlsx"
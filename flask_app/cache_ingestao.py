@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Cache em disco das planilhas do Drive já limpas (passo 1).
+
+Cada planilha é guardada depois de limpeza, tipos e deduplicação, com a chave
+(ID do arquivo, modifiedTime do Drive). Enquanto o arquivo não muda no Drive, o job seguinte
+carrega o DataFrame do disco em vez de ler e limpar a planilha de novo.
+Formato colunar (parquet) quando o pyarrow está instalado; senão, pickle.
+CacheDadosIdentificador usa a mesma chave para a tabela DadosIdentificador, com uma cópia em memória.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+# Incrementar quando a limpeza/tipagem do passo 1 mudar, para invalidar entradas antigas
+VERSAO_CACHE = 2
+
+CACHE_INGESTAO_DIR = os.getenv(
+    'CACHE_INGESTAO_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache_ingestao')
+)
+
+
+class CacheIngestao:
+    """Um arquivo por planilha: <file_id>.<assinatura>.parquet (ou .pkl)"""
+
+    def __init__(self, diretorio=CACHE_INGESTAO_DIR):
+        self.diretorio = diretorio
+
+    def _assinatura(self, modified_time):
+        chave = f"v{VERSAO_CACHE}|{modified_time}"
+        return hashlib.sha1(chave.encode('utf-8')).hexdigest()[:16]
+
+    def _base(self, file_id, modified_time):
+        return os.path.join(self.diretorio, f"{file_id}.{self._assinatura(modified_time)}")
+
+    def _entradas(self, file_id=None):
+        """Arquivos do cache (todos ou só os de um file_id)"""
+        if not os.path.isdir(self.diretorio):
+            return []
+        prefixo = f"{file_id}." if file_id else ''
+        return [n for n in os.listdir(self.diretorio) if n.startswith(prefixo) and n.endswith(('.parquet', '.pkl'))]
+
+    def carregar(self, file_id, modified_time):
+        """DataFrame em cache para esta versão do arquivo, ou None (ausente, desatualizado ou ilegível)"""
+        if not file_id or not modified_time:
+            return None
+        base = self._base(file_id, modified_time)
+        for caminho in (base + '.parquet', base + '.pkl'):
+            if not os.path.exists(caminho):
+                continue
+            try:
+                if caminho.endswith('.parquet'):
+                    return pd.read_parquet(caminho)
+                with open(caminho, 'rb') as f:
+                    return pickle.load(f)
+            except Exception as e:
+                print(f"[CACHE] ⚠️ Entrada ilegível descartada ({os.path.basename(caminho)}): {str(e)}")
+                self._remover(caminho)
+        return None
+
+    def salvar(self, file_id, modified_time, df):
+        """
+        Grava a versão atual do arquivo (escrita atômica) e apaga as versões anteriores dele.
+        Colunas object com tipos misturados não cabem em parquet; nesse caso grava em pickle.
+        """
+        if not file_id or not modified_time or df is None:
+            return
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            base = self._base(file_id, modified_time)
+            caminho = None
+            if PARQUET_DISPONIVEL:
+                try:
+                    df.to_parquet(base + '.parquet.tmp', index=False)
+                    caminho = base + '.parquet'
+                except Exception:
+                    self._remover(base + '.parquet.tmp')
+            if caminho is None:
+                with open(base + '.pkl.tmp', 'wb') as f:
+                    pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+                caminho = base + '.pkl'
+            os.replace(caminho + '.tmp', caminho)
+            atual = os.path.basename(caminho)
+            for nome in self._entradas(file_id):
+                if nome != atual:
+                    self._remover(os.path.join(self.diretorio, nome))
+        except Exception as e:
+            print(f"[CACHE] ⚠️ Não foi possível gravar cache de {file_id}: {str(e)}")
+
+    def podar(self, file_ids_ativos):
+        """Remove entradas de arquivos que não estão mais na pasta do Drive"""
+        ativos = set(file_ids_ativos)
+        for nome in self._entradas():
+            if nome.split('.', 1)[0] not in ativos:
+                self._remover(os.path.join(self.diretorio, nome))
+
+    @staticmethod
+    def _remover(caminho):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+
+class CacheDadosIdentificador(CacheIngestao):
+    """
+    Tabela DadosIdentificador lida do Sheets (Identificador, Universo, porc): em memória no processo
+    e em disco entre reinícios, válida enquanto o modifiedTime da planilha no Drive não muda.
+    """
+
+    def __init__(self, diretorio=os.path.join(CACHE_INGESTAO_DIR, 'dados_identificador')):
+        super().__init__(diretorio)
+        self._memoria = {}  # file_id -> (modified_time, DataFrame)
+        self._lock = threading.Lock()
+
+    def carregar(self, file_id, modified_time):
+        """Cópia da tabela para esta versão da planilha (memória, depois disco), ou None"""
+        with self._lock:
+            item = self._memoria.get(file_id)
+        if item is not None and item[0] == modified_time:
+            return item[1].copy()
+        df = super().carregar(file_id, modified_time)
+        if df is None:
+            return None
+        with self._lock:
+            self._memoria[file_id] = (modified_time, df)
+        return df.copy()
+
+    def salvar(self, file_id, modified_time, df):
+        super().salvar(file_id, modified_time, df)
+        if file_id and modified_time and df is not None:
+            with self._lock:
+                self._memoria[file_id] = (modified_time, df.copy())
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Calendário comercial VERISURE compartilhado pelos passos 1, 2 e 3.
+
+Cada calendário é compilado uma única vez (na importação) em um índice de intervalos
+ordenado; uma coluna inteira de datas é rotulada com um único searchsorted, em vez de
+comparar cada linha com cada período em Python.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Períodos comerciais (relatório mensal - passo 2)
+PERIODOS_COMERCIAIS = {
+    # 2025
+    "Jan'25": ("2024-12-25", "2025-01-28"),
+    "Fev'25": ("2025-01-29", "2025-02-25"),
+    "Mar'25": ("2025-02-26", "2025-03-31"),
+    "Abr'25": ("2025-04-01", "2025-04-28"),
+    "Mai'25": ("2025-04-29", "2025-05-26"),
+    "Jun'25": ("2025-05-27", "2025-06-30"),
+    "Jul'25": ("2025-07-01", "2025-07-28"),
+    "Ago'25": ("2025-07-29", "2025-08-25"),
+    "Set'25": ("2025-08-26", "2025-09-29"),
+    "Out'25": ("2025-09-30", "2025-10-27"),
+    "Nov'25": ("2025-10-28", "2025-11-24"),
+    "Dez'25": ("2025-11-25", "2025-12-29"),
+    # 2026
+    "Jan'26": ("2025-12-30", "2026-01-26"),
+    "Fev'26": ("2026-01-27", "2026-02-23"),
+    "Mar'26": ("2026-02-24", "2026-03-30"),
+    "Abr'26": ("2026-03-31", "2026-04-27"),
+    "Mai'26": ("2026-04-28", "2026-05-25"),
+    "Jun'26": ("2026-05-26", "2026-06-29"),
+    "Jul'26": ("2026-06-30", "2026-07-27"),
+    "Ago'26": ("2026-07-28", "2026-08-31"),
+    "Set'26": ("2026-09-01", "2026-09-28"),
+    "Out'26": ("2026-09-29", "2026-10-26"),
+    "Nov'26": ("2026-10-27", "2026-11-30"),
+    "Dez'26": ("2026-12-01", "2026-12-28"),
+}
+
+# Calendário Comercial 2026 usado para a coluna 'Mês Comercial' do compilado (passo 1)
+# (Mês, Data Início, Data Fim)
+MESES_COMERCIAIS_2026 = [
+    ('Janeiro', '2025-12-29', '2026-01-25'),
+    ('Fevereiro', '2026-01-26', '2026-02-22'),
+    ('Março', '2026-02-23', '2026-03-29'),
+    ('Abril', '2026-03-30', '2026-04-26'),
+    ('Maio', '2026-04-27', '2026-05-24'),
+    ('Junho', '2026-05-25', '2026-06-28'),
+    ('Julho', '2026-06-29', '2026-07-26'),
+    ('Agosto', '2026-07-27', '2026-08-30'),
+    ('Setembro', '2026-08-31', '2026-09-27'),
+    ('Outubro', '2026-09-28', '2026-10-25'),
+    ('Novembro', '2026-10-26', '2026-11-29'),
+    ('Dezembro', '2026-11-30', '2026-12-27'),
+]
+
+# Nomes dos meses abreviados em português (rótulos "Jan'26", "Fev'26", ...)
+MESES_ABREVIADOS = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+
+
+def _como_dias(datas):
+    """Converte datas (Series, array ou escalar) para datetime64[D]; inválidas viram NaT"""
+    return pd.to_datetime(datas, errors='coerce').to_numpy(dtype='datetime64[D]')
+
+
+class CalendarioComercial:
+    """Índice de intervalos [início, fim] ordenado por início, com rótulo por período"""
+
+    def __init__(self, periodos):
+        """`periodos`: iterável de (rótulo, início 'YYYY-MM-DD', fim 'YYYY-MM-DD')"""
+        ordenados = sorted(periodos, key=lambda p: p[1])
+        self.rotulos = [rotulo for rotulo, _, _ in ordenados]
+        self._rotulos = np.array(self.rotulos + [None], dtype=object)
+        self._inicios = np.array([inicio for _, inicio, _ in ordenados], dtype='datetime64[D]')
+        self._fins = np.array([fim for _, _, fim in ordenados], dtype='datetime64[D]')
+
+    @classmethod
+    def de_dicionario(cls, periodos):
+        """Cria a partir de {rótulo: (início, fim)} (formato de PERIODOS_COMERCIAIS)"""
+        return cls((rotulo, inicio, fim) for rotulo, (inicio, fim) in periodos.items())
+
+    def codigos(self, datas):
+        """Posição do período de cada data (-1 quando a data é inválida ou fica fora do calendário)"""
+        dias = _como_dias(datas)
+        pos = np.searchsorted(self._inicios, dias, side='right') - 1
+        dentro = (pos >= 0) & ~np.isnat(dias)
+        dentro &= dias <= self._fins[pos.clip(min=0)]
+        return np.where(dentro, pos, -1)
+
+    def rotular(self, datas):
+        """Rótulo do período de cada data (None fora do calendário), em um único passo vetorizado"""
+        rotulos = self._rotulos[self.codigos(datas)]
+        if isinstance(datas, pd.Series):
+            return pd.Series(rotulos, index=datas.index, dtype=object)
+        return rotulos
+
+    def periodo_para_data(self, data):
+        """Versão escalar de rotular()"""
+        return self.rotular(pd.Series([data])).iloc[0]
+
+
+CALENDARIO_PERIODOS = CalendarioComercial.de_dicionario(PERIODOS_COMERCIAIS)
+CALENDARIO_MESES_2026 = CalendarioComercial(MESES_COMERCIAIS_2026)
+
+
+def rotular_mes_abreviado(datas):
+    """Rótulo "Mmm'AA" do mês civil de cada data (ex: 04/01/2026 -> "Jan'26"); '' para datas inválidas"""
+    datas = pd.to_datetime(datas, errors='coerce')
+    meses = np.array(MESES_ABREVIADOS + [''], dtype=object)
+    indice = datas.dt.month.fillna(13).astype(int).to_numpy() - 1
+    anos = datas.dt.strftime('%y').fillna('')
+    rotulos = pd.Series(meses[indice], index=datas.index) + "'" + anos
+    return rotulos.where(datas.notna(), '')
+
+
+def rotular_ano(datas):
+    """Ano (texto, ex: '2026') de cada data; '' para datas inválidas"""
+    datas = pd.to_datetime(datas, errors='coerce')
+    return datas.dt.strftime('%Y').fillna('')
@@ -0,0 +1,599 @@
+# -*- coding: utf-8 -*-
+"""
+Backend local (falso) das APIs Google Drive v3 e Sheets v4, para rodar e cronometrar o pipeline
+sem rede (GOOGLE_BACKEND=local).
+
+Os clientes continuam sendo os da google-api-python-client (mesmo documento de discovery); só o
+transporte HTTP é trocado por HttpLocal, que responde a partir de uma pasta de fixtures:
+
+    GOOGLE_LOCAL_DIR/
+        ids.json                       (opcional) {"caminho/relativo": "ID fixo no Drive"}
+        RelatorioVeri/                 pasta do Drive (o nome da pasta é o nome no Drive)
+            Relatorio X.gsheet.xlsx    Google Sheet "Relatorio X" (valores lidos do .xlsx)
+            DadosIdentificador.gsheet.xlsx
+        Oficial/SEMANAL.xlsx           arquivo binário comum (get_media/update)
+        Uploads/                       pasta de DRIVE_FOLDER_ID (mapeada em ids.json)
+
+Arquivos criados/atualizados/apagados pelo app (uploads, pasta 'saidas') são gravados nessa
+mesma pasta. GOOGLE_LOCAL_LATENCIA_MS acrescenta latência a cada requisição e
+GOOGLE_LOCAL_ERRO_COTA (0 a 1) é a probabilidade de uma requisição receber HTTP 429.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import httplib2
+from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string
+
+GOOGLE_LOCAL_DIR = os.getenv("GOOGLE_LOCAL_DIR", "google_local")
+GOOGLE_LOCAL_LATENCIA_MS = float(os.getenv("GOOGLE_LOCAL_LATENCIA_MS", "0"))
+GOOGLE_LOCAL_ERRO_COTA = float(os.getenv("GOOGLE_LOCAL_ERRO_COTA", "0"))
+
+MIME_PASTA = 'application/vnd.google-apps.folder'
+MIME_PLANILHA = 'application/vnd.google-apps.spreadsheet'
+SUFIXO_PLANILHA = '.gsheet.xlsx'
+_MIMETYPES = {
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.csv': 'text/csv',
+    '.json': 'application/json',
+}
+
+_aleatorio = random.Random(os.getenv("GOOGLE_LOCAL_SEMENTE"))
+
+
+class ErroLocal(Exception):
+    """Erro HTTP simulado (vira uma resposta com o status e o corpo de erro no formato do Google)"""
+
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+        self.mensagem = mensagem
+
+
+# ==============================================================================
+# ARMAZÉM: ÁRVORE DE ARQUIVOS DA PASTA DE FIXTURES
+# ==============================================================================
+
+class ArmazemLocal:
+    """Arquivos e pastas do Drive falso, com IDs estáveis por caminho relativo"""
+
+    def __init__(self, raiz):
+        self.raiz = os.path.abspath(raiz)
+        self._lock = threading.RLock()
+        self._ids_fixos = {}
+        self._por_id = {}
+        self._planilhas = {}  # id -> (mtime, {aba: linhas})
+        # Diário de alterações feitas por este processo (Changes API)
+        self._sessao = hashlib.sha1(str(time.time()).encode()).hexdigest()[:8]
+        self._alteracoes = []
+        self._sessoes_upload = {}
+        self.recarregar()
+
+    # ----- índice de IDs -----
+
+    def _id_de(self, relativo):
+        if relativo in self._ids_fixos:
+            return self._ids_fixos[relativo]
+        return 'local-' + hashlib.sha1(relativo.encode('utf-8')).hexdigest()[:20]
+
+    def recarregar(self):
+        """Relê a árvore da pasta de fixtures"""
+        with self._lock:
+            caminho_ids = os.path.join(self.raiz, 'ids.json')
+            self._ids_fixos = {}
+            if os.path.exists(caminho_ids):
+                with open(caminho_ids, 'r', encoding='utf-8') as f:
+                    self._ids_fixos = {k.replace('\\', '/'): v for k, v in json.load(f).items()}
+            self._por_id = {}
+            for pasta, subpastas, arquivos in os.walk(self.raiz):
+                for nome in subpastas + arquivos:
+                    relativo = os.path.relpath(os.path.join(pasta, nome), self.raiz).replace(os.sep, '/')
+                    if relativo == 'ids.json' or nome.endswith('.tmp'):
+                        continue
+                    self._por_id[self._id_de(relativo)] = relativo
+
+    def _caminho(self, relativo):
+        return os.path.join(self.raiz, *relativo.split('/'))
+
+    def _relativo(self, file_id):
+        relativo = self._por_id.get(file_id)
+        if relativo is None or not os.path.exists(self._caminho(relativo)):
+            raise ErroLocal(404, f"File not found: {file_id}")
+        return relativo
+
+    def metadados(self, file_id):
+        with self._lock:
+            relativo = self._relativo(file_id)
+            caminho = self._caminho(relativo)
+            pai = os.path.dirname(relativo)
+            nome = os.path.basename(relativo)
+            if os.path.isdir(caminho):
+                mime = MIME_PASTA
+            elif nome.endswith(SUFIXO_PLANILHA):
+                mime, nome = MIME_PLANILHA, nome[:-len(SUFIXO_PLANILHA)]
+            else:
+                mime = _MIMETYPES.get(os.path.splitext(nome)[1].lower(), 'application/octet-stream')
+            modificado = datetime.datetime.fromtimestamp(os.path.getmtime(caminho), datetime.timezone.utc)
+            meta = {
+                'id': file_id,
+                'name': nome,
+                'mimeType': mime,
+                'modifiedTime': modificado.strftime('%Y-%m-%dT%H:%M:%S.') + f"{modificado.microsecond // 1000:03d}Z",
+                'parents': [self._id_de(pai) if pai else 'root'],
+                'trashed': False,
+                'size': str(os.path.getsize(caminho)) if not os.path.isdir(caminho) else None,
+                'webViewLink': f"file://{caminho}",
+            }
+            return {k: v for k, v in meta.items() if v is not None}
+
+    def listar(self, filtro):
+        with self._lock:
+            itens = [self.metadados(i) for i, r in list(self._por_id.items()) if os.path.exists(self._caminho(r))]
+        return sorted((m for m in itens if filtro(m)), key=lambda m: m['name'])
+
+    # ----- conteúdo -----
+
+    def ler_bytes(self, file_id):
+        with self._lock:
+            caminho = self._caminho(self._relativo(file_id))
+        if os.path.isdir(caminho):
+            raise ErroLocal(403, "Folders have no content")
+        with open(caminho, 'rb') as f:
+            return f.read()
+
+    def linhas_planilha(self, file_id):
+        """{aba: linhas (listas de valores)} de uma planilha, em cache até o arquivo mudar"""
+        with self._lock:
+            caminho = self._caminho(self._relativo(file_id))
+            mtime = os.path.getmtime(caminho)
+            em_cache = self._planilhas.get(file_id)
+            if em_cache and em_cache[0] == mtime:
+                return em_cache[1]
+        wb = load_workbook(caminho, read_only=True, data_only=True)
+        try:
+            abas = {ws.title: [list(linha) for linha in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+        finally:
+            wb.close()
+        with self._lock:
+            self._planilhas[file_id] = (mtime, abas)
+        return abas
+
+    # ----- alterações -----
+
+    def _registrar_alteracao(self, file_id, removido=False):
+        self._alteracoes.append((file_id, removido))
+
+    def criar(self, metadados, conteudo=None):
+        nome = metadados.get('name') or 'Sem titulo'
+        pai = (metadados.get('parents') or ['root'])[0]
+        with self._lock:
+            relativo_pai = '' if pai == 'root' else self._relativo(pai)
+            if metadados.get('mimeType') == MIME_PLANILHA:
+                nome += SUFIXO_PLANILHA
+            relativo = f"{relativo_pai}/{nome}" if relativo_pai else nome
+            caminho = self._caminho(relativo)
+            if metadados.get('mimeType') == MIME_PASTA:
+                os.makedirs(caminho, exist_ok=True)
+            else:
+                with open(caminho, 'wb') as f:
+                    f.write(conteudo or b'')
+            file_id = self._id_de(relativo)
+            self._por_id[file_id] = relativo
+            self._registrar_alteracao(file_id)
+            return self.metadados(file_id)
+
+    def atualizar(self, file_id, metadados=None, conteudo=None):
+        with self._lock:
+            relativo = self._relativo(file_id)
+            if conteudo is not None:
+                with open(self._caminho(relativo), 'wb') as f:
+                    f.write(conteudo)
+            self._registrar_alteracao(file_id)
+            return self.metadados(file_id)
+
+    def apagar(self, file_id):
+        with self._lock:
+            caminho = self._caminho(self._relativo(file_id))
+            if os.path.isdir(caminho):
+                shutil.rmtree(caminho)
+            else:
+                os.remove(caminho)
+            self._registrar_alteracao(file_id, removido=True)
+
+    # ----- Changes API -----
+
+    def token_atual(self):
+        with self._lock:
+            return f"{self._sessao}-{len(self._alteracoes)}"
+
+    def alteracoes_desde(self, token):
+        """Alterações feitas por este processo desde o token (token de outro processo -> 400)"""
+        sessao, _, posicao = (token or '').partition('-')
+        if sessao != self._sessao or not posicao.isdigit():
+            raise ErroLocal(400, f"Invalid page token: {token}")
+        with self._lock:
+            pendentes = self._alteracoes[int(posicao):]
+            saida = []
+            for file_id, removido in pendentes:
+                if removido or file_id not in self._por_id:
+                    saida.append({'fileId': file_id, 'removed': True})
+                else:
+                    try:
+                        saida.append({'fileId': file_id, 'removed': False, 'file': self.metadados(file_id)})
+                    except ErroLocal:
+                        saida.append({'fileId': file_id, 'removed': True})
+            return saida
+
+    # ----- uploads resumíveis -----
+
+    def abrir_sessao_upload(self, file_id, metadados):
+        with self._lock:
+            sessao = hashlib.sha1(f"{time.time()}{len(self._sessoes_upload)}".encode()).hexdigest()[:16]
+            self._sessoes_upload[sessao] = {'file_id': file_id, 'metadados': metadados, 'dados': bytearray()}
+            return sessao
+
+    def sessao_upload(self, sessao):
+        with self._lock:
+            if sessao not in self._sessoes_upload:
+                raise ErroLocal(404, "Upload session not found")
+            return self._sessoes_upload[sessao]
+
+    def fechar_sessao_upload(self, sessao):
+        with self._lock:
+            dados = self._sessoes_upload.pop(sessao)
+        conteudo = bytes(dados['dados'])
+        if dados['file_id']:
+            return self.atualizar(dados['file_id'], dados['metadados'], conteudo)
+        return self.criar(dados['metadados'], conteudo)
+
+
+_armazem = None
+_armazem_lock = threading.Lock()
+
+def armazem():
+    """Armazém único do processo (criado no primeiro uso, a partir de GOOGLE_LOCAL_DIR)"""
+    global _armazem
+    with _armazem_lock:
+        if _armazem is None:
+            if not os.path.isdir(GOOGLE_LOCAL_DIR):
+                raise FileNotFoundError(f"GOOGLE_LOCAL_DIR não encontrado: {GOOGLE_LOCAL_DIR}")
+            _armazem = ArmazemLocal(GOOGLE_LOCAL_DIR)
+        return _armazem
+
+
+# ==============================================================================
+# CONSULTAS DO DRIVE (q=) E VALORES DO SHEETS
+# ==============================================================================
+
+_TERMO_Q = re.compile(
+    r"^(?:(?P<campo>name|mimeType)\s*(?P<op>=|!=|contains)\s*'(?P<valor>(?:[^'\\]|\\.)*)'"
+    r"|'(?P<pai>[^']+)'\s+in\s+parents"
+    r"|trashed\s*=\s*(?P<lixeira>true|false))$"
+)
+
+def _filtro_q(q):
+    """Converte uma query do Drive (subconjunto: name, mimeType, parents, trashed com 'and') em filtro"""
+    condicoes = []
+    for termo in re.split(r"\s+and\s+", (q or '').strip()) if q else []:
+        m = _TERMO_Q.match(termo.strip())
+        if not m:
+            raise ErroLocal(400, f"Unsupported query term (local backend): {termo}")
+        if m.group('pai'):
+            pai = m.group('pai')
+            condicoes.append(lambda a, pai=pai: pai in a['parents'])
+        elif m.group('lixeira'):
+            lixeira = m.group('lixeira') == 'true'
+            condicoes.append(lambda a, lixeira=lixeira: a['trashed'] == lixeira)
+        else:
+            campo, op, valor = m.group('campo'), m.group('op'), m.group('valor').replace("\\'", "'")
+            if op == '=':
+                condicoes.append(lambda a, c=campo, v=valor: a[c] == v)
+            elif op == '!=':
+                condicoes.append(lambda a, c=campo, v=valor: a[c] != v)
+            else:
+                condicoes.append(lambda a, c=campo, v=valor.lower(): v in a[c].lower())
+    return lambda a: all(c(a) for c in condicoes)
+
+
+def _texto_celula(valor):
+    """Valor como o Sheets devolve em FORMATTED_VALUE (aproximação)"""
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'TRUE' if valor else 'FALSE'
+    if isinstance(valor, datetime.datetime):
+        if valor.time() == datetime.time(0, 0):
+            return valor.strftime('%d/%m/%Y')
+        return valor.strftime('%d/%m/%Y %H:%M:%S')
+    if isinstance(valor, datetime.date):
+        return valor.strftime('%d/%m/%Y')
+    if isinstance(valor, datetime.time):
+        return valor.strftime('%H:%M:%S')
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def _sem_vazios_no_fim(listas):
+    """Remove células vazias no fim de cada lista e listas vazias no fim (como a API)"""
+    saida = []
+    for lista in listas:
+        lista = list(lista)
+        while lista and lista[-1] == '':
+            lista.pop()
+        saida.append(lista)
+    while saida and not saida[-1]:
+        saida.pop()
+    return saida
+
+
+def _valores_range(abas, range_a1, major='ROWS'):
+    """values para um range A1 ('Aba'!A1:B2, 'Aba'!C:F, 'Aba'!1:1 ou só 'Aba')"""
+    if '!' in range_a1:
+        titulo, a1 = range_a1.rsplit('!', 1)
+    else:
+        titulo, a1 = range_a1, ''
+    if titulo.startswith("'") and titulo.endswith("'"):
+        titulo = titulo[1:-1].replace("''", "'")
+    if titulo not in abas:
+        raise ErroLocal(400, f"Unable to parse range: {range_a1}")
+    linhas = abas[titulo]
+    n_colunas = max((len(l) for l in linhas), default=0)
+
+    m = re.fullmatch(r"([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?", a1.upper())
+    if not m:
+        raise ErroLocal(400, f"Unable to parse range: {range_a1}")
+    col1, lin1, col2, lin2 = m.groups()
+    if col2 is None and lin2 is None:
+        col2, lin2 = col1, lin1  # célula única ('A1') ou aba inteira ('')
+        if not a1:
+            col2 = lin2 = ''
+    c_ini = column_index_from_string(col1) - 1 if col1 else 0
+    c_fim = column_index_from_string(col2) if col2 else n_colunas
+    l_ini = int(lin1) - 1 if lin1 else 0
+    l_fim = int(lin2) if lin2 else len(linhas)
+
+    recorte = []
+    for linha in linhas[l_ini:l_fim]:
+        recorte.append([_texto_celula(linha[c]) if c < len(linha) else '' for c in range(c_ini, c_fim)])
+    if major == 'COLUMNS':
+        recorte = [list(coluna) for coluna in zip(*recorte)] if recorte else []
+    return _sem_vazios_no_fim(recorte)
+
+
+# ==============================================================================
+# TRANSPORTE HTTP (substitui httplib2.Http nos clientes)
+# ==============================================================================
+
+def _resposta(status, corpo=b'', **cabecalhos):
+    info = {'status': str(status)}
+    info.update({k.replace('_', '-'): str(v) for k, v in cabecalhos.items()})
+    if isinstance(corpo, (dict, list)):
+        corpo = json.dumps(corpo).encode('utf-8')
+        info.setdefault('content-type', 'application/json; charset=UTF-8')
+    elif isinstance(corpo, str):
+        corpo = corpo.encode('utf-8')
+    return httplib2.Response(info), corpo
+
+
+def _erro(status, mensagem):
+    estados = {400: 'INVALID_ARGUMENT', 403: 'PERMISSION_DENIED', 404: 'NOT_FOUND', 429: 'RESOURCE_EXHAUSTED'}
+    return _resposta(status, {'error': {'code': status, 'message': mensagem, 'status': estados.get(status, 'UNKNOWN')}})
+
+
+def _corpo_bytes(body):
+    if body is None:
+        return b''
+    if hasattr(body, 'read'):
+        body = body.read()
+    return body.encode('utf-8') if isinstance(body, str) else bytes(body)
+
+
+def _partes_multipart(corpo, content_type):
+    """Partes (cabeçalhos, conteúdo) de um corpo multipart gerado pela googleapiclient"""
+    fronteira = re.search(r'boundary="?([^";]+)"?', content_type).group(1).encode()
+    partes = []
+    for bloco in corpo.split(b'--' + fronteira)[1:]:
+        if bloco.startswith(b'--'):
+            break
+        bloco = bloco.lstrip(b'\r\n')
+        # Fim dos cabeçalhos: a primeira linha em branco (CRLF ou LF, o que vier antes)
+        fim_crlf, fim_lf = bloco.find(b'\r\n\r\n'), bloco.find(b'\n\n')
+        separador = b'\r\n\r\n' if fim_crlf != -1 and (fim_lf == -1 or fim_crlf < fim_lf) else b'\n\n'
+        cabecalho, _, conteudo = bloco.partition(separador)
+        if conteudo.endswith(b'\r\n'):
+            conteudo = conteudo[:-2]
+        elif conteudo.endswith(b'\n'):
+            conteudo = conteudo[:-1]
+        cabecalhos = {}
+        for linha in cabecalho.decode('utf-8', 'replace').splitlines():
+            if ':' in linha:
+                chave, valor = linha.split(':', 1)
+                cabecalhos[chave.strip().lower()] = valor.strip()
+        partes.append((cabecalhos, conteudo))
+    return partes
+
+
+class HttpLocal:
+    """Objeto com a interface de httplib2.Http.request() que atende Drive v3 e Sheets v4 localmente"""
+
+    def __init__(self, armazem_local=None):
+        self._armazem = armazem_local
+
+    @property
+    def armazem(self):
+        return self._armazem or armazem()
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None):
+        if GOOGLE_LOCAL_LATENCIA_MS:
+            time.sleep(GOOGLE_LOCAL_LATENCIA_MS / 1000.0)
+        if GOOGLE_LOCAL_ERRO_COTA and _aleatorio.random() < GOOGLE_LOCAL_ERRO_COTA:
+            return _erro(429, "Quota exceeded (local backend)")
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        try:
+            return self._rotear(uri, method.upper(), _corpo_bytes(body), headers)
+        except ErroLocal as e:
+            return _erro(e.status, e.mensagem)
+
+    # ----- roteamento -----
+
+    def _rotear(self, uri, method, corpo, headers):
+        partes = urlsplit(uri)
+        caminho = unquote(partes.path)
+        params = parse_qs(partes.query)
+
+        if caminho.startswith('/sessao-upload/'):
+            return self._upload_resumivel(caminho.rsplit('/', 1)[1], corpo, headers)
+        if caminho.startswith('/batch/'):
+            return self._batch(corpo, headers)
+        if caminho.startswith('/upload/drive/v3/files'):
+            return self._upload(caminho[len('/upload/drive/v3/files'):].strip('/'), method, corpo, headers, params, uri)
+        if caminho.startswith('/drive/v3/'):
+            return self._drive(caminho[len('/drive/v3/'):], method, corpo, headers, params)
+        if partes.netloc.startswith('sheets.') and caminho.startswith('/v4/spreadsheets/'):
+            return self._sheets(partes.path[len('/v4/spreadsheets/'):], params)
+        raise ErroLocal(404, f"Not supported by the local backend: {method} {uri}")
+
+    # ----- Drive -----
+
+    def _drive(self, caminho, method, corpo, headers, params):
+        a = self.armazem
+        if caminho == 'changes/startPageToken':
+            return _resposta(200, {'startPageToken': a.token_atual()})
+        if caminho == 'changes':
+            alteracoes = a.alteracoes_desde(params.get('pageToken', [''])[0])
+            return _resposta(200, {'changes': alteracoes, 'newStartPageToken': a.token_atual()})
+        if caminho == 'files' and method == 'GET':
+            itens = a.listar(_filtro_q(params.get('q', [''])[0]))
+            tamanho = int(params.get('pageSize', ['100'])[0])
+            inicio = int(params.get('pageToken', ['0'])[0] or 0)
+            resposta = {'files': itens[inicio:inicio + tamanho]}
+            if inicio + tamanho < len(itens):
+                resposta['nextPageToken'] = str(inicio + tamanho)
+            return _resposta(200, resposta)
+        if caminho == 'files' and method == 'POST':
+            return _resposta(200, a.criar(json.loads(corpo or b'{}')))
+
+        m = re.fullmatch(r'files/([^/]+)(/export)?', caminho)
+        if not m:
+            raise ErroLocal(404, f"Not supported by the local backend: {method} /drive/v3/{caminho}")
+        file_id, exportar = m.group(1), m.group(2)
+        if method == 'DELETE':
+            a.apagar(file_id)
+            return _resposta(204)
+        if method == 'PATCH':
+            return _resposta(200, a.atualizar(file_id, json.loads(corpo or b'{}')))
+        if exportar or params.get('alt', [''])[0] == 'media':
+            return self._conteudo(a.ler_bytes(file_id), headers)
+        return _resposta(200, a.metadados(file_id))
+
+    def _conteudo(self, dados, headers):
+        """Download com suporte ao header Range (MediaIoBaseDownload pede em blocos)"""
+        faixa = re.fullmatch(r'bytes=(\d+)-(\d*)', headers.get('range', ''))
+        if not faixa:
+            return _resposta(200, dados, content_length=len(dados))
+        inicio = int(faixa.group(1))
+        fim = min(int(faixa.group(2)) if faixa.group(2) else len(dados) - 1, len(dados) - 1)
+        if inicio >= len(dados):
+            return _resposta(416, b'', content_range=f"bytes */{len(dados)}")
+        return _resposta(206, dados[inicio:fim + 1], content_range=f"bytes {inicio}-{fim}/{len(dados)}")
+
+    def _upload(self, file_id, method, corpo, headers, params, uri):
+        a = self.armazem
+        tipo = params.get('uploadType', ['media'])[0]
+        if tipo == 'resumable':
+            metadados = json.loads(corpo) if corpo else {}
+            sessao = a.abrir_sessao_upload(file_id or None, metadados)
+            return _resposta(200, b'', location=f"https://local.googleapis.com/sessao-upload/{sessao}")
+        if tipo == 'multipart':
+            partes = _partes_multipart(corpo, headers.get('content-type', ''))
+            metadados, conteudo = json.loads(partes[0][1] or b'{}'), partes[1][1]
+        else:
+            metadados, conteudo = {}, corpo
+        if file_id:
+            return _resposta(200, a.atualizar(file_id, metadados, conteudo))
+        return _resposta(200, a.criar(metadados, conteudo))
+
+    def _upload_resumivel(self, sessao, corpo, headers):
+        a = self.armazem
+        dados = a.sessao_upload(sessao)
+        faixa = headers.get('content-range', '')
+        m = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+|\*)', faixa)
+        if m:
+            inicio = int(m.group(1))
+            del dados['dados'][inicio:]
+            dados['dados'].extend(corpo)
+            total = m.group(3)
+        else:
+            # Consulta de estado ("bytes */total") depois de um erro
+            total = faixa.rsplit('/', 1)[-1] if faixa else '*'
+        recebidos = len(dados['dados'])
+        if total != '*' and recebidos >= int(total):
+            return _resposta(200, a.fechar_sessao_upload(sessao))
+        if recebidos == 0:
+            return _resposta(308)
+        return _resposta(308, b'', range=f"bytes=0-{recebidos - 1}")
+
+    def _batch(self, corpo, headers):
+        """Requisição batch (multipart/mixed): cada parte é repassada ao roteador"""
+        fronteira = 'batch_local_' + hashlib.sha1(corpo[:64]).hexdigest()[:12]
+        saida = []
+        for cabecalhos, conteudo in _partes_multipart(corpo, headers.get('content-type', '')):
+            linhas = conteudo.decode('utf-8', 'replace').split('\n')
+            metodo, alvo = linhas[0].strip().split(' ')[:2]
+            status, corpo_resposta = self.request('https://www.googleapis.com' + alvo, metodo)
+            texto = corpo_resposta.decode('utf-8', 'replace')
+            content_id = cabecalhos.get('content-id', '<local+0>').strip('<>')
+            saida.append(
+                f"--{fronteira}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status.status} OK\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{texto}\r\n"
+            )
+        saida.append(f"--{fronteira}--\r\n")
+        return _resposta(200, ''.join(saida), content_type=f"multipart/mixed; boundary={fronteira}")
+
+    # ----- Sheets -----
+
+    def _sheets(self, caminho, params):
+        a = self.armazem
+        spreadsheet_id, _, resto = caminho.partition('/')
+        if spreadsheet_id.endswith('values:batchGet'):
+            spreadsheet_id, resto = spreadsheet_id[:-len('/values:batchGet')], 'values:batchGet'
+        spreadsheet_id = unquote(spreadsheet_id)
+        if ':' in spreadsheet_id and not resto:
+            spreadsheet_id, _, resto = spreadsheet_id.partition(':')
+            resto = 'values:' + resto if resto == 'batchGet' else resto
+        abas = a.linhas_planilha(spreadsheet_id)
+        major = params.get('majorDimension', ['ROWS'])[0]
+
+        if not resto:
+            return _resposta(200, {'spreadsheetId': spreadsheet_id, 'sheets': [
+                {'properties': {'title': titulo, 'gridProperties': {
+                    'rowCount': max(len(linhas), 1000),
+                    'columnCount': max(max((len(l) for l in linhas), default=0), 26)}}}
+                for titulo, linhas in abas.items()
+            ]})
+        if resto == 'values:batchGet':
+            faixas = params.get('ranges', [])
+            return _resposta(200, {'spreadsheetId': spreadsheet_id, 'valueRanges': [
+                self._value_range(abas, r, major) for r in faixas
+            ]})
+        if resto.startswith('values/'):
+            return _resposta(200, self._value_range(abas, unquote(resto[len('values/'):]), major))
+        raise ErroLocal(404, f"Not supported by the local backend: sheets {caminho}")
+
+    @staticmethod
+    def _value_range(abas, range_a1, major):
+        valores = _valores_range(abas, range_a1, major)
+        resposta = {'range': range_a1, 'majorDimension': major}
+        if valores:
+            resposta['values'] = valores
+        return resposta
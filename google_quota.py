@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Controle de cota das APIs do Google (Sheets/Drive)
+
+Um token bucket compartilhado entre threads limita as leituras à cota real do Google
+(60 leituras/minuto por usuário no Sheets) e as respostas 429/5xx são repetidas com backoff.
+"""
+
+import os
+import random
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+# Cota de leituras do Sheets por minuto por usuário (padrão do Google: 60)
+SHEETS_LEITURAS_POR_MINUTO = int(os.getenv("SHEETS_LEITURAS_POR_MINUTO", "60"))
+# Rajada permitida (fichas acumuladas); o restante da cota é reposto ao longo do minuto
+SHEETS_RAJADA = int(os.getenv("SHEETS_RAJADA", "5"))
+
+# Status HTTP que valem nova tentativa (cota excedida e erros temporários do servidor)
+STATUS_RETENTAVEIS = (429, 500, 502, 503, 504)
+MAX_TENTATIVAS = 5
+BACKOFF_INICIAL_SEC = 2.0
+BACKOFF_MAXIMO_SEC = 64.0
+
+
+class TokenBucket:
+    """Token bucket thread-safe: `capacidade` fichas, repostas a `taxa_por_segundo`"""
+
+    def __init__(self, capacidade, taxa_por_segundo):
+        self.capacidade = float(capacidade)
+        self.taxa_por_segundo = float(taxa_por_segundo)
+        self._fichas = float(capacidade)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def por_minuto(cls, requisicoes_por_minuto, rajada=SHEETS_RAJADA):
+        """
+        Bucket para uma cota de N requisições/minuto: `rajada` fichas iniciais e reposição de
+        N - rajada por minuto, de modo que nenhuma janela de 60s passe de N requisições
+        """
+        rajada = max(1, min(rajada, requisicoes_por_minuto // 2))
+        return cls(rajada, max(requisicoes_por_minuto - rajada, 1) / 60.0)
+
+    def _repor(self):
+        agora = time.monotonic()
+        self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) * self.taxa_por_segundo)
+        self._ultimo = agora
+
+    def adquirir(self, fichas=1):
+        """Bloqueia até haver `fichas` disponíveis e as consome"""
+        while True:
+            with self._lock:
+                self._repor()
+                if self._fichas >= fichas:
+                    self._fichas -= fichas
+                    return
+                espera = (fichas - self._fichas) / self.taxa_por_segundo
+            time.sleep(espera)
+
+
+# Limitador único do processo para leituras do Sheets (todas as threads do passo 1)
+LIMITADOR_LEITURAS_SHEETS = TokenBucket.por_minuto(SHEETS_LEITURAS_POR_MINUTO)
+
+
+def _status_http(erro):
+    """Status HTTP de um HttpError (None se não disponível)"""
+    try:
+        return int(erro.resp.status)
+    except Exception:
+        return None
+
+
+def executar_com_cota(requisicao, limitador=LIMITADOR_LEITURAS_SHEETS, descricao=""):
+    """
+    Executa uma requisição da googleapiclient (`.execute()`) respeitando o limitador.
+    429/5xx são repetidos com backoff exponencial + jitter (até MAX_TENTATIVAS); cada nova
+    tentativa também consome uma ficha. Outros erros sobem direto para o chamador.
+    """
+    espera = BACKOFF_INICIAL_SEC
+    for tentativa in range(1, MAX_TENTATIVAS + 1):
+        if limitador is not None:
+            limitador.adquirir()
+        try:
+            return requisicao.execute()
+        except HttpError as e:
+            status = _status_http(e)
+            if status not in STATUS_RETENTAVEIS or tentativa == MAX_TENTATIVAS:
+                raise
+            pausa = min(espera, BACKOFF_MAXIMO_SEC) + random.uniform(0, 1)
+            print(f"[COTA] ⏳ HTTP {status} {descricao} - tentativa {tentativa}/{MAX_TENTATIVAS}, aguardando {pausa:.1f}s")
+            time.sleep(pausa)
+            espera *= 2
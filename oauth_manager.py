@@ -6,6 +6,8 @@ Gerenciamento de autenticação OAuth 2.0 para Google Drive
 import os
 import json
 import pickle
+import threading
+from datetime import datetime, timedelta, timezone
 from google_auth_oauthlib.flow import Flow
 from google.auth.transport.requests import Request
 from oauth_config import OAUTH_CLIENT_ID, OAUTH_CLIENT_SECRET, OAUTH_REDIRECT_URI, OAUTH_SCOPES, TOKEN_FILE
@@ -43,6 +45,8 @@ def save_credentials(creds):
             'client_id': creds.client_id,
             'client_secret': creds.client_secret,
             'scopes': creds.scopes,
+            # Validade do access token (UTC): permite renovar antes de expirar
+            'expiry': creds.expiry.isoformat() if creds.expiry else None,
         }
         json.dump(token_data, f)
     print(f"[OAUTH] ✅ Credenciais salvas em {TOKEN_FILE}")
@@ -59,13 +63,15 @@ def load_credentials():
         # Criar credenciais do refresh token
         from google.oauth2.credentials import Credentials
         
+        expiry = token_data.get('expiry')
         creds = Credentials(
             token=token_data.get('token'),
             refresh_token=token_data.get('refresh_token'),
             token_uri=token_data.get('token_uri'),
             client_id=OAUTH_CLIENT_ID,
             client_secret=OAUTH_CLIENT_SECRET,
-            scopes=OAUTH_SCOPES
+            scopes=OAUTH_SCOPES,
+            expiry=datetime.fromisoformat(expiry) if expiry else None
         )
         
         # Se token expirou, refresh automaticamente
@@ -118,26 +124,160 @@ def exchange_code_for_token(code, redirect_uri=None):
     flow.fetch_token(code=code)
     creds = flow.credentials
     save_credentials(creds)
+    invalidar_credenciais()
     return creds
 
-def get_authenticated_drive_service():
-    """Retorna um serviço Google Drive autenticado via OAuth"""
-    from googleapiclient.discovery import build
+# ==============================================================================
+# CACHE DE CREDENCIAIS E CLIENTES (compartilhado por todo o processo)
+# ==============================================================================
+
+# Documentos de discovery das APIs (drive v3, sheets v4) lidos de arquivo local uma vez por processo:
+# GOOGLE_DISCOVERY_DIR/<api>.<versao>.json se definido, senão as cópias que acompanham a
+# google-api-python-client fixada no requirements.txt. Nunca busca o documento pela rede.
+GOOGLE_DISCOVERY_DIR = os.getenv("GOOGLE_DISCOVERY_DIR")
+_documentos_discovery = {}
+
+def _documento_discovery(api, versao):
+    """Texto JSON do documento de discovery da API (lido do disco só na primeira chamada)"""
+    chave = (api, versao)
+    documento = _documentos_discovery.get(chave)
+    if documento is None:
+        if GOOGLE_DISCOVERY_DIR:
+            with open(os.path.join(GOOGLE_DISCOVERY_DIR, f"{api}.{versao}.json"), 'r', encoding='utf-8') as f:
+                documento = f.read()
+        else:
+            from googleapiclient.discovery_cache import get_static_doc
+            documento = get_static_doc(api, versao)
+        if documento is None:
+            raise FileNotFoundError(f"Documento de discovery local não encontrado para {api} {versao}")
+        _documentos_discovery[chave] = documento
+    return documento
+
+# GOOGLE_BACKEND=local: Drive/Sheets respondidos pelo backend falso de google_local.py (pasta
+# GOOGLE_LOCAL_DIR), sem rede nem login, para rodar e cronometrar o pipeline offline
+GOOGLE_BACKEND_LOCAL = os.getenv("GOOGLE_BACKEND", "").lower() == "local"
+
+def construir_cliente(api, versao, credentials):
+    """Equivalente a build(api, versao, credentials=...) a partir do documento de discovery local"""
+    from googleapiclient.discovery import build_from_document
+    if GOOGLE_BACKEND_LOCAL:
+        from google_local import HttpLocal
+        return build_from_document(_documento_discovery(api, versao), http=HttpLocal())
+    return build_from_document(_documento_discovery(api, versao), credentials=credentials)
+
+class _HttpPorThread:
+    """
+    Transporte dos clientes compartilhados: httplib2.Http não é thread-safe, então cada thread
+    usa a sua própria conexão autorizada (criada na primeira requisição da thread)
+    """
     
-    creds = load_credentials()
-    if not creds:
-        return None
+    def __init__(self, credentials):
+        self.credentials = None if GOOGLE_BACKEND_LOCAL else credentials
+        self._local = threading.local()
     
-    service = build('drive', 'v3', credentials=creds)
-    return service
-
-def get_authenticated_sheets_service():
-    """Retorna um serviço Google Sheets autenticado via OAuth"""
-    from googleapiclient.discovery import build
+    def _http(self):
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            if GOOGLE_BACKEND_LOCAL:
+                from google_local import HttpLocal
+                http = HttpLocal()
+            else:
+                import google_auth_httplib2
+                from googleapiclient.http import build_http
+                http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=build_http())
+            self._local.http = http
+        return http
+    
+    def request(self, *args, **kwargs):
+        return self._http().request(*args, **kwargs)
     
-    creds = load_credentials()
+    def __getattr__(self, nome):
+        return getattr(self._http(), nome)
+
+# O token é renovado quando faltar menos que isso para expirar (antes de qualquer requisição falhar)
+RENOVAR_TOKEN_ANTES = timedelta(minutes=5)
+
+_credenciais_lock = threading.RLock()
+_credenciais = None
+# Clientes do processo: (api, versao) -> (credenciais, cliente); o transporte é por thread (_HttpPorThread)
+_clientes_lock = threading.Lock()
+_clientes = {}
+
+def _precisa_renovar(creds):
+    if not creds.token or creds.expiry is None:
+        return True
+    # google-auth guarda a validade como datetime ingênuo em UTC
+    expiry = creds.expiry if creds.expiry.tzinfo else creds.expiry.replace(tzinfo=timezone.utc)
+    return expiry - datetime.now(timezone.utc) < RENOVAR_TOKEN_ANTES
+
+def get_credentials():
+    """
+    Credenciais compartilhadas do processo: token.json é lido uma vez e o access token é renovado
+    uma única vez (sob lock) pouco antes de expirar. Retorna None se não autenticado.
+    """
+    global _credenciais
+    with _credenciais_lock:
+        if _credenciais is None and GOOGLE_BACKEND_LOCAL:
+            from google.oauth2.credentials import Credentials
+            validade = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=3650)
+            _credenciais = Credentials(token='backend-local', expiry=validade)
+        if _credenciais is None:
+            _credenciais = load_credentials()
+            if _credenciais is None:
+                return None
+        
+        if _precisa_renovar(_credenciais) and _credenciais.refresh_token:
+            try:
+                _credenciais.refresh(Request())
+                save_credentials(_credenciais)
+                print("[OAUTH] ✅ Token renovado antes de expirar")
+            except Exception as refresh_error:
+                print(f"[OAUTH] ❌ Erro ao renovar token: {str(refresh_error)}")
+                _credenciais = None
+                return None
+        return _credenciais
+
+def invalidar_credenciais():
+    """Descarta credenciais e clientes em cache (ex: após novo login); a próxima chamada relê o token.json"""
+    global _credenciais
+    with _credenciais_lock:
+        _credenciais = None
+
+def _cliente_compartilhado(api, versao):
+    """Cliente da API do processo (um por API), reconstruído só quando as credenciais mudam"""
+    creds = get_credentials()
     if not creds:
         return None
     
-    service = build('sheets', 'v4', credentials=creds)
-    return service
+    with _clientes_lock:
+        em_cache = _clientes.get((api, versao))
+        if em_cache is None or em_cache[0] is not creds:
+            from googleapiclient.discovery import build_from_document
+            cliente = build_from_document(_documento_discovery(api, versao), http=_HttpPorThread(creds))
+            em_cache = (creds, cliente)
+            _clientes[(api, versao)] = em_cache
+        return em_cache[1]
+
+def get_authenticated_drive_service():
+    """Retorna um serviço Google Drive autenticado via OAuth (compartilhado pelo processo)"""
+    return _cliente_compartilhado('drive', 'v3')
+
+def get_authenticated_sheets_service():
+    """Retorna um serviço Google Sheets autenticado via OAuth (compartilhado pelo processo)"""
+    return _cliente_compartilhado('sheets', 'v4')
+
+def preaquecer_clientes():
+    """
+    Chamado na subida do worker: carrega os documentos de discovery e, se já houver login,
+    monta os clientes compartilhados. A conexão HTTP de cada thread ainda é aberta na
+    primeira requisição dela.
+    """
+    try:
+        for api, versao in (('drive', 'v3'), ('sheets', 'v4')):
+            _documento_discovery(api, versao)
+        if GOOGLE_BACKEND_LOCAL or os.path.exists(TOKEN_FILE):
+            get_authenticated_drive_service()
+            get_authenticated_sheets_service()
+        print(f"[OAUTH] ✅ Clientes Google pré-carregados{' (backend local)' if GOOGLE_BACKEND_LOCAL else ''}")
+    except Exception as e:
+        print(f"[OAUTH] ⚠️ Não foi possível pré-carregar clientes Google: {str(e)}")